@@ -0,0 +1,66 @@
+"""Password verification throughput through the credential pool.
+
+    python -m benchmarks.credentials_bench --logins 200
+
+Each login is one verify of a stored hash at the configured cost, submitted
+from as many client threads as there are workers so the pool stays busy.
+Reports logins/s for each worker count and logins/s per worker, which is
+logins/s per core while workers do not exceed the cores available.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from credentials import CredentialPool, hash_fields  # noqa: E402
+from utils import PASSWORD_HASH_SCHEME, PBKDF2_ITERATIONS, SCRYPT_COST  # noqa: E402
+
+
+def measure(workers: int, logins: int, stored: dict, password: str) -> float:
+    """Logins per second with `workers` pool threads."""
+    pool = CredentialPool(workers=workers, queue_limit=max(workers * 2, 1))
+    per_client = max(logins // workers, 1)
+
+    def client():
+        for _ in range(per_client):
+            ok, _ = pool.verify(password, stored)
+            assert ok
+
+    clients = [threading.Thread(target=client) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    return per_client * workers / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    password = "Passw0rd!"
+    stored = hash_fields(password)
+    cost = SCRYPT_COST if PASSWORD_HASH_SCHEME == "scrypt" else PBKDF2_ITERATIONS
+    print(f"{PASSWORD_HASH_SCHEME} cost={cost}, {os.cpu_count()} CPU(s)")
+    workers = 1
+    while True:
+        rate = measure(workers, args.logins, stored, password)
+        print(f"{workers:3d} worker(s): {rate:8.1f} logins/s, {rate / workers:7.1f} logins/s per worker")
+        if workers >= args.max_workers:
+            break
+        workers = min(workers * 2, args.max_workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Deterministic synthetic data for scale testing.
+
+    python -m benchmarks.generate --size 100k --out bench_data/100k
+
+Writes medicines.json, users.json, orders.jsonl and consultations.json in the
+layout utils expects, streaming every file so the 1M preset never holds a
+whole dataset in memory.
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterator
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SEED = 42
+
+CATEGORIES = ["Tablet", "Syrup", "Capsule", "Ointment", "Drops", "Gel", "Spray", "Powder", "Injection", "Inhaler"]
+STEMS = ["para", "ibu", "amoxi", "cetiri", "metfor", "atorva", "omepra", "azithro", "losar", "salbu",
+         "diclo", "panto", "levo", "cipro", "fluco", "montelu", "ranit", "domper", "ondan", "predni"]
+SUFFIXES = ["cetamol", "profen", "cillin", "zine", "min", "statin", "zole", "mycin", "tan", "tamol",
+            "fenac", "prazole", "floxacin", "conazole", "kast", "tidine", "ridone", "setron", "solone"]
+FORMS = ["", "Forte", "Plus", "XR", "Junior", "DS", "500", "250", "Max", "Cold & Flu"]
+USES = ["pain", "fever", "cough", "acidity", "allergy", "infection", "diabetes", "cholesterol",
+        "asthma", "nausea", "inflammation", "blood pressure", "cold", "skin rash", "dehydration"]
+MAKERS = [f"{prefix} {kind}" for prefix in ("Sun", "Cipla", "Lupin", "Zydus", "Mankind", "Alkem",
+                                            "Torrent", "Glen", "Intas", "Abbott")
+          for kind in ("Pharma", "Labs", "Healthcare", "Life Sciences", "Remedies")]
+
+
+def _write_array(path: str, records: Iterator[Dict]):
+    with open(path, "w") as f:
+        f.write("[\n")
+        first = True
+        for record in records:
+            if not first:
+                f.write(",\n")
+            f.write(json.dumps(record))
+            first = False
+        f.write("\n]\n")
+
+
+def _medicines(rng: random.Random, count: int, start: datetime) -> Iterator[Dict]:
+    for med_id in range(1, count + 1):
+        name = (rng.choice(STEMS) + rng.choice(SUFFIXES)).capitalize()
+        form = rng.choice(FORMS)
+        medicine = {
+            "id": med_id,
+            "name": f"{name} {form}".strip(),
+            "price": rng.randint(5, 1500),
+            "stock": rng.choice([0, rng.randint(1, 5), rng.randint(6, 500)]),
+            "category": rng.choice(CATEGORIES),
+            "description": f"Used to treat {rng.choice(USES)} and {rng.choice(USES)}.",
+            "expiry_date": (start + timedelta(days=rng.randint(-120, 900))).strftime("%Y-%m-%d"),
+        }
+        if rng.random() < 0.7:
+            medicine["manufacturer"] = rng.choice(MAKERS)
+        if rng.random() < 0.2:
+            medicine["requires_prescription"] = True
+        yield medicine
+
+
+def user_name(index: int) -> str:
+    return f"user{index:07d}"
+
+
+def generate(out_dir: str, size: int, seed: int = DEFAULT_SEED) -> Dict[str, int]:
+    """Write a dataset with `size` medicines, users, orders and consultations."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    medicine_count = size
+    user_count = max(3, size // 10)
+    order_count = size
+    consult_count = max(1, size // 5)
+
+    _write_array(os.path.join(out_dir, "medicines.json"), _medicines(rng, medicine_count, start))
+
+    with open(os.path.join(out_dir, "users.json"), "w") as f:
+        f.write("{\n")
+        for index in range(user_count):
+            username = user_name(index)
+            record = {"email": f"{username}@example.com", "password": f"Passw0rd!{index}", "role": "user"}
+            f.write(("," if index else "") + f"{json.dumps(username)}: {json.dumps(record)}\n")
+        f.write("}\n")
+
+    # Orders go to the append-only journal, oldest first; a few users order a lot
+    with open(os.path.join(out_dir, "orders.jsonl"), "w") as f:
+        when = start
+        for _ in range(order_count):
+            when += timedelta(seconds=rng.randint(1, 600))
+            if rng.random() < 0.1:
+                user_index = rng.randrange(min(20, user_count))
+            else:
+                user_index = rng.randrange(user_count)
+            items = []
+            for _ in range(rng.randint(1, 4)):
+                med_id = rng.randint(1, medicine_count)
+                items.append({"id": med_id, "name": f"Medicine {med_id}", "price": rng.randint(5, 1500),
+                              "qty": rng.randint(1, 5)})
+            order = {
+                "user": user_name(user_index),
+                "items": items,
+                "total": sum(item["price"] * item["qty"] for item in items),
+                "datetime": when.strftime("%Y-%m-%d %H:%M:%S"),
+                "address": f"{rng.randint(1, 999)} Main Road",
+            }
+            f.write(json.dumps(order, separators=(",", ":")) + "\n")
+
+    def consultations():
+        when = start
+        for _ in range(consult_count):
+            when += timedelta(seconds=rng.randint(1, 3000))
+            yield {
+                "user": user_name(rng.randrange(user_count)),
+                "symptoms": rng.choice(USES),
+                "preferred_time": rng.choice(["morning", "5-6pm", "tomorrow"]),
+                "datetime": when.strftime("%Y-%m-%d %H:%M:%S"),
+                "status": "Requested",
+            }
+
+    _write_array(os.path.join(out_dir, "consultations.json"), consultations())
+    return {"medicines": medicine_count, "users": user_count, "orders": order_count,
+            "consultations": consult_count}
+
+
+def parse_size(value: str) -> int:
+    value = value.lower()
+    if value in SIZES:
+        return SIZES[value]
+    return int(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic MediCare dataset")
+    parser.add_argument("--size", default="1k", help="1k, 100k, 1m or an explicit count")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--out", default=None, help="output directory (default bench_data/<size>)")
+    args = parser.parse_args(argv)
+    out_dir = args.out or os.path.join("bench_data", args.size.lower())
+    counts = generate(out_dir, parse_size(args.size), args.seed)
+    print(f"Wrote {counts} to {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
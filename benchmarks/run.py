@@ -0,0 +1,268 @@
+"""Scale benchmarks for the hot paths, with a machine-readable report.
+
+    python -m benchmarks.run --size 100k
+    python -m benchmarks.run --size 1k --update-baseline
+
+Each run generates (or reuses via --data) a synthetic dataset, times the
+catalog, search, order and login paths against it, writes a JSON report and
+compares medians with benchmarks/baseline.json. Exit status is 1 when any
+benchmark regressed beyond the tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.generate import DEFAULT_SEED, generate, parse_size, user_name  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE = 0.5  # fraction slower than baseline before we call it a regression
+NOISE_FLOOR_MS = 0.05   # ignore differences smaller than this
+
+SEARCH_TERMS = ["para", "profen", "cough", "statin", "Tablet", "fever and", "zole", "max"]
+FUZZY_TERMS = ["paracetmol", "ibuprofn", "cogh", "atorvastatn", "omeprazol"]
+
+BENCHMARKS: List[Dict[str, Any]] = []
+
+
+def benchmark(name: str, repeat: int = 20):
+    """Register fn(context) -> callable-to-time under `name`."""
+    def register(fn):
+        BENCHMARKS.append({"name": name, "repeat": repeat, "setup": fn})
+        return fn
+    return register
+
+
+def _cycle(values):
+    state = {"i": 0}
+
+    def next_value():
+        value = values[state["i"] % len(values)]
+        state["i"] += 1
+        return value
+    return next_value
+
+
+@benchmark("catalog_load", repeat=5)
+def bench_catalog_load(ctx):
+    return lambda: ctx["cache"].get(force_refresh=True)
+
+
+@benchmark("search_exact")
+def bench_search(ctx):
+    catalog, term = ctx["catalog"], _cycle(SEARCH_TERMS)
+    return lambda: catalog.filter_positions(term(), "All", False)
+
+
+@benchmark("search_fuzzy")
+def bench_search_fuzzy(ctx):
+    catalog, term = ctx["catalog"], _cycle(FUZZY_TERMS)
+    catalog.trigram_index  # build the index up front so only queries are timed
+    return lambda: catalog.filter_positions(term(), "All", False, fuzzy=True)
+
+
+@benchmark("filter_category_stock")
+def bench_filter(ctx):
+    catalog = ctx["catalog"]
+    category = _cycle(catalog.categories)
+    return lambda: catalog.filter_positions("", category(), True)
+
+
+@benchmark("sort_search_results")
+def bench_sort(ctx):
+    catalog, term, key = ctx["catalog"], _cycle(SEARCH_TERMS), _cycle(["Name", "Price", "Stock"])
+
+    def run():
+        catalog._results.clear()  # measure ordering, not the per-query result cache
+        return catalog.query(term(), "All", True, False, key())[:20]
+    return run
+
+
+@benchmark("order_append", repeat=200)
+def bench_order_append(ctx):
+    storage = ctx["storage"]
+    order = {"user": user_name(1), "items": [{"id": 1, "name": "Medicine 1", "price": 10, "qty": 2}],
+             "total": 20, "datetime": "2025-06-01 10:00:00", "address": "1 Main Road"}
+    return lambda: storage.append_order(dict(order))
+
+
+CHECKOUT_THREADS = 8
+CHECKOUTS_PER_THREAD = 25
+
+
+def _checkout_burst(place):
+    """Time CHECKOUT_THREADS concurrent users each placing CHECKOUTS_PER_THREAD orders."""
+    order = {"user": user_name(2), "items": [{"id": 1, "name": "Medicine 1", "price": 10, "qty": 1}],
+             "total": 10, "datetime": "2025-06-01 10:00:00", "address": "1 Main Road"}
+
+    def user():
+        for _ in range(CHECKOUTS_PER_THREAD):
+            place(dict(order))
+
+    def run():
+        threads = [threading.Thread(target=user) for _ in range(CHECKOUT_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return run
+
+
+@benchmark("checkout_burst_direct", repeat=5)
+def bench_checkout_direct(ctx):
+    return _checkout_burst(ctx["storage"].append_order)
+
+
+@benchmark("checkout_burst_queued", repeat=5)
+def bench_checkout_queued(ctx):
+    from write_queue import WriteBehindQueue
+    writer = WriteBehindQueue(ctx["storage"])
+    return _checkout_burst(lambda order: writer.submit_order(order).result())
+
+
+@benchmark("user_history", repeat=5)
+def bench_user_history(ctx):
+    storage = ctx["storage"]
+    return lambda: storage.user_orders(user_name(0))
+
+
+@benchmark("user_history_page", repeat=20)
+def bench_user_history_page(ctx):
+    storage = ctx["storage"]
+    storage.user_orders_page(user_name(0), 0, 10)  # first call builds the JSON order index
+    return lambda: storage.user_orders_page(user_name(0), 0, 10)
+
+
+@benchmark("login_lookup", repeat=50)
+def bench_login_lookup(ctx):
+    storage, users = ctx["storage"], ctx["user_count"]
+    username = _cycle([user_name(i) for i in range(0, users, max(1, users // 50))])
+    return lambda: storage.get_user(username())
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "runs": repeat,
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+    }
+
+
+def run_suite(data_dir: str, backend: str, only: List[str] = None) -> Dict[str, Any]:
+    os.chdir(data_dir)
+    # Imported after chdir: the stores resolve utils' relative file names lazily
+    from catalog import CatalogCache
+    from storage import create_storage
+
+    if backend == "sharded":
+        from order_journal import OrderJournal
+        from order_shards import ShardedOrderStore, build_shards
+        if not ShardedOrderStore().shard_paths():
+            build_shards(OrderJournal(fsync="never"), fsync="never")
+    storage = create_storage(backend)
+    cache = CatalogCache(loader=storage.load_medicines, signature=storage.catalog_signature)
+    ctx = {"storage": storage, "cache": cache, "catalog": cache.get(),
+           "user_count": len(storage.load_users())}
+    results = {}
+    for bench in BENCHMARKS:
+        if only and bench["name"] not in only:
+            continue
+        fn = bench["setup"](ctx)
+        results[bench["name"]] = _time(fn, bench["repeat"])
+        print(f"  {bench['name']:<24} median {results[bench['name']]['median_ms']:>10.3f} ms", flush=True)
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median_ms"], stats["median_ms"]
+        if after > before * (1 + tolerance) and after - before > NOISE_FLOOR_MS:
+            regressions.append({"name": name, "baseline_ms": before, "median_ms": after,
+                                "ratio": round(after / before, 2) if before else None})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run MediCare scale benchmarks")
+    parser.add_argument("--size", default="1k", help="1k, 100k, 1m or an explicit count")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--data", help="reuse an existing dataset directory (it will be appended to)")
+    parser.add_argument("--backend", choices=["json", "sharded", "sqlite"], default="json")
+    parser.add_argument("--only", nargs="*", help="run only these benchmarks")
+    parser.add_argument("--report", default="bench_report.json")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    report_path = os.path.abspath(args.report)
+    size = parse_size(args.size)
+    data_dir = os.path.abspath(args.data) if args.data else tempfile.mkdtemp(prefix="medicare-bench-")
+    try:
+        if not args.data:
+            print(f"Generating {size} records in {data_dir}", flush=True)
+            generate(data_dir, size, args.seed)
+        results = run_suite(data_dir, args.backend, args.only)
+    finally:
+        os.chdir(os.path.dirname(report_path))
+        if not args.data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    key = f"{args.size.lower()}/{args.backend}"
+    baselines = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baselines = json.load(f)
+    regressions = compare(results, baselines.get(key, {}), args.tolerance)
+    report = {
+        "meta": {
+            "size": size,
+            "seed": args.seed,
+            "backend": args.backend,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+        "baseline_key": key,
+        "regressions": regressions,
+    }
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {report_path}")
+
+    if args.update_baseline:
+        baselines[key] = {name: {"median_ms": stats["median_ms"]} for name, stats in results.items()}
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Baseline {key} updated")
+        return 0
+    for regression in regressions:
+        print(f"REGRESSION {regression['name']}: {regression['baseline_ms']} ms -> "
+              f"{regression['median_ms']} ms (x{regression['ratio']})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
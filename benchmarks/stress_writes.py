@@ -0,0 +1,110 @@
+"""Concurrent writer processes against the JSON stores.
+
+    python -m benchmarks.stress_writes --processes 16 --records 50
+
+Every process signs up its own users, places orders and requests
+consultations through JsonStorage at the same time. Afterwards every record
+must be present and every file must parse. Exit status is 1 when anything
+was lost, and lock wait times from utils.lock_stats() are reported per file.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def _writer(args) -> Dict[str, Any]:
+    data_dir, worker, records = args
+    os.chdir(data_dir)
+    from storage import JsonStorage
+    from utils import lock_stats
+
+    storage = JsonStorage()
+    for i in range(records):
+        username = f"stress{worker:03d}_{i:05d}"
+        storage.add_user(username, {"email": f"{username}@example.com", "password": "Passw0rd!", "role": "user"})
+        storage.append_order({"user": username, "items": [{"id": 1, "name": "Medicine 1", "price": 10, "qty": 1}],
+                              "total": 10, "datetime": "2025-06-01 10:00:00", "address": f"{worker} Main Road"})
+        storage.append_consultation({"user": username, "symptoms": "fever", "preferred_time": "morning",
+                                     "datetime": "2025-06-01 10:00:00", "status": "Requested"})
+    return lock_stats()
+
+
+def _merge_stats(results):
+    merged: Dict[str, Dict[str, float]] = {}
+    for stats in results:
+        for filename, entry in stats.items():
+            total = merged.setdefault(filename, {"acquired": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0})
+            total["acquired"] += entry["acquired"]
+            total["wait_ms_total"] += entry["wait_ms_total"]
+            total["wait_ms_max"] = max(total["wait_ms_max"], entry["wait_ms_max"])
+    for entry in merged.values():
+        entry["wait_ms_avg"] = round(entry["wait_ms_total"] / entry["acquired"], 3)
+        entry["wait_ms_total"] = round(entry["wait_ms_total"], 3)
+    return merged
+
+
+def verify(data_dir: str, processes: int, records: int) -> Dict[str, int]:
+    """Count missing records per store; raises if a file does not parse."""
+    from user_directory import UserDirectory
+    from utils import CONSULTS_FILE, ORDERS_JOURNAL_FILE, USERS_FILE, USERS_LOG_FILE
+
+    expected = {f"stress{w:03d}_{i:05d}" for w in range(processes) for i in range(records)}
+    users = set(UserDirectory(os.path.join(data_dir, USERS_LOG_FILE), os.path.join(data_dir, USERS_FILE)).usernames())
+    orders = set()
+    with open(os.path.join(data_dir, ORDERS_JOURNAL_FILE)) as f:
+        for line in f:
+            orders.add(json.loads(line)["user"])
+    with open(os.path.join(data_dir, CONSULTS_FILE)) as f:
+        consults = {c["user"] for c in json.load(f)}
+    return {
+        "users": len(expected - users),
+        "orders": len(expected - orders),
+        "consultations": len(expected - consults),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress the JSON stores with concurrent writer processes")
+    parser.add_argument("--processes", type=int, default=16)
+    parser.add_argument("--records", type=int, default=50, help="users, orders and consultations per process")
+    parser.add_argument("--data", help="directory to write into (default: a temporary directory)")
+    args = parser.parse_args(argv)
+
+    data_dir = os.path.abspath(args.data) if args.data else tempfile.mkdtemp(prefix="medicare-stress-")
+    os.makedirs(data_dir, exist_ok=True)
+    try:
+        start = time.perf_counter()
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.map(_writer, [(data_dir, w, args.records) for w in range(args.processes)])
+        elapsed = time.perf_counter() - start
+        missing = verify(data_dir, args.processes, args.records)
+    finally:
+        if not args.data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    writes = args.processes * args.records * 3
+    print(f"{args.processes} processes x {args.records} records: {writes} writes in {elapsed:.2f}s "
+          f"({writes / elapsed:.0f} writes/s)")
+    for filename, entry in sorted(_merge_stats(results).items()):
+        print(f"  lock {filename:<20} acquired {entry['acquired']:>6}  wait avg {entry['wait_ms_avg']:>8.3f} ms"
+              f"  max {entry['wait_ms_max']:>8.3f} ms")
+    lost = {kind: count for kind, count in missing.items() if count}
+    if lost:
+        print(f"LOST RECORDS: {lost}")
+        return 1
+    print("No records lost")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
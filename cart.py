@@ -1,5 +1,101 @@
 import streamlit as st
-import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from expiry import classify, to_ordinal_array, days_until, EXPIRED, EXPIRING, UNKNOWN
+
+def _money(price) -> Decimal:
+    # Via str so 10.1 is exactly 10.1, not the nearest binary float
+    return Decimal(str(price))
+
+class Cart:
+    """Cart lines keyed by medicine id, with running totals.
+
+    Adding, updating or removing a line is O(1) and keeps the line count,
+    quantity and amount current, so badges and summaries never re-sum the
+    cart. The amount is kept as a Decimal so adding and removing lines never
+    accumulates float error. Lines keep insertion order; to_list() gives the
+    list-of-dicts shape stored with orders.
+    """
+
+    def __init__(self, items: Optional[Iterable[Dict[str, Any]]] = None):
+        self._lines: Dict[Any, Dict[str, Any]] = {}
+        self.total_qty = 0
+        self._amount = Decimal(0)
+        for item in items or ():
+            self.add(item)
+
+    @property
+    def total_amount(self):
+        """Sum of price * qty; an int when whole, as summing int prices gave."""
+        if self._amount == self._amount.to_integral_value():
+            return int(self._amount)
+        return float(self._amount)
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # Lines are yielded as-is; change them through update_qty/remove only
+        return iter(self._lines.values())
+
+    def __contains__(self, medicine_id):
+        return medicine_id in self._lines
+
+    def get(self, medicine_id) -> Optional[Dict[str, Any]]:
+        return self._lines.get(medicine_id)
+
+    def add(self, item: Dict[str, Any]) -> bool:
+        """Add a line, merging quantities with an existing line for the same id.
+
+        Returns True when a new line was created. Raises ValueError for an
+        item without an id, which would otherwise merge with every other one.
+        """
+        medicine_id = item.get("id")
+        if medicine_id is None:
+            raise ValueError(f"Cannot add {item.get('name', 'an item')} to the cart: it has no id")
+        qty = item.get("qty", 0)
+        price = item.get("price", 0)
+        existing = self._lines.get(medicine_id)
+        if existing is not None:
+            existing["qty"] += qty
+            self.total_qty += qty
+            self._amount += _money(existing.get("price", 0)) * qty
+            return False
+        self._lines[medicine_id] = dict(item)
+        self.total_qty += qty
+        self._amount += _money(price) * qty
+        return True
+
+    def update_qty(self, medicine_id, qty: int):
+        line = self._lines[medicine_id]
+        delta = qty - line["qty"]
+        line["qty"] = qty
+        self.total_qty += delta
+        self._amount += _money(line.get("price", 0)) * delta
+
+    def remove(self, medicine_id):
+        line = self._lines.pop(medicine_id, None)
+        if line is not None:
+            self.total_qty -= line["qty"]
+            self._amount -= _money(line.get("price", 0)) * line["qty"]
+
+    def clear(self):
+        self._lines.clear()
+        self.total_qty = 0
+        self._amount = Decimal(0)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Cart lines as plain dicts, the shape orders store under "items"."""
+        return [dict(line) for line in self._lines.values()]
+
+def get_cart() -> Cart:
+    """The session's Cart, upgrading a list-shaped cart from older sessions."""
+    cart = st.session_state.get("cart")
+    if not isinstance(cart, Cart):
+        # Lines without an id cannot be keyed; older sessions may hold some
+        cart = Cart(item for item in cart or () if item.get("id") is not None)
+        st.session_state["cart"] = cart
+    return cart
 
 def top_bar():
     st.markdown("""
@@ -8,10 +104,26 @@ def top_bar():
     </div>
     """, unsafe_allow_html=True)
 
+def _apply_cart_edits():
+    """Update Cart callback: apply every quantity change and removal at once."""
+    cart = get_cart()
+    for item in list(cart):
+        medicine_id = item.get('id')
+        if st.session_state.get(f"cart_remove_{medicine_id}"):
+            cart.remove(medicine_id)
+            continue
+        qty = st.session_state.get(f"cart_qty_{medicine_id}", item['qty'])
+        if qty != item['qty']:
+            cart.update_qty(medicine_id, qty)
+
+def _clear_cart():
+    get_cart().clear()
+    st.session_state["cart_quantities"] = {}
+
 def show_cart():
     top_bar()
     st.title("🛒 Your Cart")
-    cart = st.session_state.get("cart", [])
+    cart = get_cart()
     if not cart:
         st.info("🛍️ Your cart is empty. Start shopping to add medicines!")
         if st.button("Browse Medicines", key="browse_meds", type="primary", use_container_width=True):
@@ -23,42 +135,39 @@ def show_cart():
     with col1:
         st.metric("Items in Cart", len(cart))
     with col2:
-        total_qty = sum(item['qty'] for item in cart)
-        st.metric("Total Quantity", total_qty)
+        st.metric("Total Quantity", cart.total_qty)
     with col3:
-        total_amount = sum(item['price'] * item['qty'] for item in cart)
-        st.metric("Total Amount", f"₹{total_amount}")
+        st.metric("Total Amount", f"₹{cart.total_amount}")
 
     st.divider()
-    for i, item in enumerate(cart):
-        with st.container():
+    # One pass over the cart's expiry dates instead of parsing each line
+    expiry_labels = cart_expiry_statuses(cart)
+    # All edits are applied together on submit, so changing several lines
+    # costs one script run; widget keys follow the medicine id, not the row.
+    with st.form("cart_form"):
+        for i, item in enumerate(cart):
+            medicine_id = item.get('id')
             col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
             with col1:
                 st.write(f"**{item['name']}**")
                 st.write(f"Price: ₹{item['price']} per unit")
                 expiry_date = item.get('expiry_date', 'Not specified')
-                st.write(f"Expiry: {expiry_date}")
+                st.write(f"Expiry: {expiry_date} {expiry_labels[i]}")
             with col2:
-                new_qty = st.number_input(
+                st.number_input(
                     "Qty",
                     min_value=1,
                     max_value=99,
                     value=item['qty'],
-                    key=f"qty_{i}"
+                    key=f"cart_qty_{medicine_id}"
                 )
-                if new_qty != item['qty']:
-                    cart[i]['qty'] = new_qty
-                    st.session_state["cart"] = cart
-                    st.rerun()
             with col3:
                 subtotal = item['price'] * item['qty']
                 st.write(f"**₹{subtotal}**")
             with col4:
-                if st.button("Remove", key=f"remove_{i}", type="secondary"):
-                    cart.pop(i)
-                    st.session_state["cart"] = cart
-                    st.rerun()
-        st.divider()
+                st.checkbox("Remove", key=f"cart_remove_{medicine_id}")
+            st.divider()
+        st.form_submit_button("🔄 Update Cart", on_click=_apply_cart_edits, use_container_width=True)
 
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -66,34 +175,31 @@ def show_cart():
             st.session_state["dashboard_menu_selected"] = 0
             st.rerun()
     with col2:
-        if st.button("Clear Cart", use_container_width=True, type="secondary"):
-            st.session_state["cart"] = []
-            st.session_state["cart_quantities"] = {}
-            st.rerun()
+        st.button("Clear Cart", use_container_width=True, type="secondary", on_click=_clear_cart)
     with col3:
         if st.button("Order Now", key="order_now", use_container_width=True, type="primary"):
             st.session_state["current_page"] = "order"
             st.rerun()
 
-    st.success(f"**Total Amount: ₹{total_amount}**")
+    st.success(f"**Total Amount: ₹{cart.total_amount}**")
     return True
 
+def _expiry_label(status, days_until_expiry, expiry_date_str):
+    if status == EXPIRED:
+        return "⚠️ EXPIRED"
+    elif status == EXPIRING:
+        return f"⏰ Expires in {days_until_expiry} days"
+    elif status == UNKNOWN:
+        return "📅 Date format invalid" if expiry_date_str else "📅 Unknown"
+    return "✅ Fresh"
+
+def cart_expiry_statuses(cart, today=None):
+    """Expiry label for every cart line, classified in a single call."""
+    expiry_dates = [item.get('expiry_date') for item in cart]
+    ordinals = to_ordinal_array(expiry_dates)
+    statuses = classify(ordinals, today)
+    days = days_until(ordinals, today)
+    return [_expiry_label(statuses[i], days[i], expiry_dates[i]) for i in range(len(cart))]
+
 def get_expiry_status(expiry_date_str):
-    try:
-        expiry_parts = expiry_date_str.split('-')
-        if len(expiry_parts) == 3:
-            expiry_year = int(expiry_parts[0])
-            expiry_month = int(expiry_parts[1])
-            expiry_day = int(expiry_parts[2])
-            today = datetime.datetime.now()
-            expiry_date = datetime.datetime(expiry_year, expiry_month, expiry_day)
-            days_until_expiry = (expiry_date - today).days
-            if days_until_expiry < 0:
-                return "⚠️ EXPIRED"
-            elif days_until_expiry <= 30:
-                return f"⏰ Expires in {days_until_expiry} days"
-            else:
-                return "✅ Fresh"
-    except Exception:
-        return "📅 Date format invalid"
-    return "📅 Unknown"
+    return cart_expiry_statuses([{'expiry_date': expiry_date_str}])[0]
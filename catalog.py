@@ -0,0 +1,334 @@
+import threading
+import time
+from datetime import date
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from expiry import classify, days_until, ordinal_array, parse_ordinal, EXPIRY_WARNING_DAYS
+from medicine_store import MedicineStore, MedicineView
+from search_index import TokenIndex, TrigramIndex
+from storage import get_storage
+
+CACHE_DURATION = 300  # seconds; reload even if the signature looks unchanged
+
+REQUIRED_FIELDS = ("name", "price", "stock", "expiry_date")
+
+# Sort orders offered by the medicines page: (key function, descending)
+SORT_KEYS = {
+    "Name": (lambda med: med.get("name", ""), False),
+    "Price": (lambda med: med.get("price", 0), False),
+    "Stock": (lambda med: med.get("stock", 0), True),
+}
+RELEVANCE = "Relevance"
+_RESULT_CACHE_SIZE = 64
+
+
+def validate_medicine(medicine: Dict[str, Any]) -> bool:
+    return all(field in medicine for field in REQUIRED_FIELDS)
+
+
+class CatalogResults(Sequence):
+    """Ordered query result: catalog positions resolved to medicines on access."""
+
+    def __init__(self, medicines: List[Dict[str, Any]], positions: Sequence[int]):
+        self._medicines = medicines
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._medicines[pos] for pos in self.positions[index]]
+        return self._medicines[self.positions[index]]
+
+
+class Catalog:
+    """One immutable, validated snapshot of the medicine catalog.
+
+    Rows live in a columnar MedicineStore shared by every session; `medicines`
+    hands out dict-like MedicineView rows.
+    """
+
+    def __init__(self, medicines: List[Dict[str, Any]], version: int):
+        self.version = version
+        self.medicines = MedicineStore(medicines)
+        store = self.medicines
+        self.position_by_id = {med_id: pos for pos, med_id in enumerate(store.columns["id"])}
+        # Parsed once per version (and once per distinct date string); the
+        # classification is then one array pass per day
+        code_ordinals = [parse_ordinal(value) for value in store.codes["expiry_date"]]
+        self.expiry_ordinals = ordinal_array(code_ordinals[code] for code in store.columns["expiry_date"])
+        self._expiry_status: Optional[Tuple[Tuple[int, int], Sequence[int], Sequence[int]]] = None
+        self._build_facets()
+        self._lock = threading.Lock()
+        self._token_index: Optional[TokenIndex] = None
+        self._trigram_index: Optional[TrigramIndex] = None
+        self._sorted_views: Dict[Tuple[str, str, bool], Tuple[int, ...]] = {}
+        self._ranks: Dict[str, List[int]] = {}
+        self._results: "OrderedDict[tuple, CatalogResults]" = OrderedDict()
+
+    def __len__(self):
+        return len(self.medicines)
+
+    def _build_facets(self):
+        store = self.medicines
+        names = ["Other"] + store.codes["category"][1:]  # code 0: no category
+        categories: Dict[str, List[int]] = {}
+        for pos, code in enumerate(store.columns["category"]):
+            categories.setdefault(names[code], []).append(pos)
+        in_stock = [pos for pos, stock in enumerate(store.columns["stock"]) if stock > 0]
+        self.in_stock_ids: FrozenSet[int] = frozenset(in_stock)
+        self.category_ids: Dict[str, FrozenSet[int]] = {
+            category: frozenset(ids) for category, ids in categories.items()
+        }
+        self.category_in_stock_ids: Dict[str, FrozenSet[int]] = {
+            category: ids & self.in_stock_ids for category, ids in self.category_ids.items()
+        }
+        self.categories: List[str] = sorted(self.category_ids)
+
+    def get_by_id(self, medicine_id: Any) -> Optional[MedicineView]:
+        pos = self.position_by_id.get(medicine_id)
+        return None if pos is None else self.medicines[pos]
+
+    def position_of(self, medicine: Any) -> Optional[int]:
+        """Catalog position of a row served from this snapshot."""
+        if isinstance(medicine, MedicineView) and medicine.store is self.medicines:
+            return medicine.position
+        return None
+
+    def expiry_status(self, today: Optional[date] = None,
+                      warning_days: int = EXPIRY_WARNING_DAYS) -> Tuple[Sequence[int], Sequence[int]]:
+        """(status codes, days to expiry) for the whole catalog, cached per day."""
+        today = today or date.today()
+        key = (today.toordinal(), warning_days)
+        cached = self._expiry_status
+        if cached is None or cached[0] != key:
+            cached = (key, classify(self.expiry_ordinals, today, warning_days),
+                      days_until(self.expiry_ordinals, today))
+            self._expiry_status = cached
+        return cached[1], cached[2]
+
+    def category_facets(self, in_stock_only: bool = False) -> List[Tuple[str, int]]:
+        """(category, count) pairs in name order, e.g. for "Tablet (42)" labels."""
+        ids = self.category_in_stock_ids if in_stock_only else self.category_ids
+        return [(category, len(ids[category])) for category in self.categories]
+
+    def _allowed_ids(self, category: str, in_stock_only: bool) -> Optional[FrozenSet[int]]:
+        """Positions passing the category/stock filters; None when nothing is filtered out."""
+        if category != "All":
+            ids = self.category_in_stock_ids if in_stock_only else self.category_ids
+            return ids.get(category, frozenset())
+        if in_stock_only:
+            return self.in_stock_ids
+        return None
+
+    @property
+    def token_index(self) -> TokenIndex:
+        """Search index, built on first use and kept for this catalog version."""
+        if self._token_index is None:
+            with self._lock:
+                if self._token_index is None:
+                    self._token_index = TokenIndex(self.medicines)
+        return self._token_index
+
+    @property
+    def trigram_index(self) -> TrigramIndex:
+        """Typo-tolerant index over the token vocabulary, built on first fuzzy query."""
+        if self._trigram_index is None:
+            token_index = self.token_index
+            with self._lock:
+                if self._trigram_index is None:
+                    self._trigram_index = TrigramIndex(token_index)
+        return self._trigram_index
+
+    def search_positions(self, search_term: str, fuzzy: bool = False) -> List[int]:
+        """Positions matching `search_term`.
+
+        Fuzzy mode returns every exact match too, so turning it on never
+        loses results: exact matches come first (by fuzzy score where they
+        have one), then the typo-tolerant hits by score.
+        """
+        token_index = self.token_index
+        positions = token_index.search(search_term)
+        if positions is None:
+            # no word characters to look up: plain substring scan
+            needle = search_term.lower()
+            positions = [pos for pos, fields in enumerate(token_index.haystacks)
+                         if any(needle in field for field in fields)]
+        if not fuzzy:
+            return positions
+        ranked = [pos for pos, _ in self.trigram_index.search(search_term)]
+        exact = set(positions)
+        scored = set(ranked)
+        return ([pos for pos in ranked if pos in exact]
+                + [pos for pos in positions if pos not in scored]
+                + [pos for pos in ranked if pos not in exact])
+
+    def filter_positions(self, search_term: str = "", category: str = "All",
+                         in_stock_only: bool = True, fuzzy: bool = False) -> List[int]:
+        allowed = self._allowed_ids(category, in_stock_only)
+        if search_term:
+            positions = self.search_positions(search_term, fuzzy)
+            if allowed is None:
+                return positions
+            return [pos for pos in positions if pos in allowed]
+        if allowed is None:
+            return list(range(len(self.medicines)))
+        return sorted(allowed)
+
+    def sorted_view(self, sort_by: str, category: str = "All", in_stock_only: bool = False) -> Tuple[int, ...]:
+        """Positions in `sort_by` order, restricted to a category/stock facet.
+
+        The full ordering is sorted once per catalog version; each facet view is
+        a single filtered walk over it, cached for the rest of the version.
+        """
+        view_key = (sort_by, category, in_stock_only)
+        view = self._sorted_views.get(view_key)
+        if view is not None:
+            return view
+        if category == "All" and not in_stock_only:
+            key, descending = SORT_KEYS[sort_by]
+            medicines = self.medicines
+            view = tuple(sorted(range(len(medicines)), key=lambda pos: key(medicines[pos]), reverse=descending))
+            ranks = [0] * len(view)
+            for rank, pos in enumerate(view):
+                ranks[pos] = rank
+            self._ranks[sort_by] = ranks
+        else:
+            allowed = self._allowed_ids(category, in_stock_only)
+            view = tuple(pos for pos in self.sorted_view(sort_by) if pos in allowed)
+        self._sorted_views[view_key] = view
+        return view
+
+    def _order(self, positions: List[int], sort_by: str) -> List[int]:
+        full = self.sorted_view(sort_by)
+        if len(positions) * 8 < len(full):
+            # few matches: order them by their precomputed integer rank
+            rank = self._ranks[sort_by]
+            return sorted(positions, key=rank.__getitem__)
+        matched = set(positions)
+        return [pos for pos in full if pos in matched]
+
+    def query(self, search_term: str = "", category: str = "All", in_stock_only: bool = True,
+              fuzzy: bool = False, sort_by: str = "Name") -> CatalogResults:
+        """Filtered, ordered medicines; paging the result is a plain slice.
+
+        Results are cached per query, so a rerun that only changes the page
+        costs O(page size).
+        """
+        if sort_by == RELEVANCE and not (fuzzy and search_term):
+            sort_by = "Name"
+        cache_key = (search_term, category, in_stock_only, fuzzy, sort_by)
+        with self._lock:
+            cached = self._results.get(cache_key)
+            if cached is not None:
+                self._results.move_to_end(cache_key)
+                return cached
+        if search_term:
+            positions = self.filter_positions(search_term, category, in_stock_only, fuzzy)
+            if sort_by != RELEVANCE:
+                positions = self._order(positions, sort_by)
+        else:
+            positions = self.sorted_view(sort_by, category, in_stock_only)
+        results = CatalogResults(self.medicines, positions)
+        with self._lock:
+            self._results[cache_key] = results
+            if len(self._results) > _RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return results
+
+    def filter(self, search_term: str = "", category: str = "All",
+               in_stock_only: bool = True, fuzzy: bool = False) -> List[Dict[str, Any]]:
+        medicines = self.medicines
+        return [medicines[pos] for pos in self.filter_positions(search_term, category, in_stock_only, fuzzy)]
+
+
+class CatalogCache:
+    """Process-wide catalog shared by every Streamlit session.
+
+    The snapshot is reloaded when the store's catalog signature (file mtime and
+    size for JSON) changes, when bump_version() is called, or on force_refresh.
+    """
+
+    def __init__(self, loader: Optional[Callable[[], List[Dict[str, Any]]]] = None,
+                 signature: Optional[Callable[[], Any]] = None,
+                 max_age: float = CACHE_DURATION):
+        self._loader = loader or (lambda: get_storage().load_medicines())
+        self._signature = signature or (lambda: get_storage().catalog_signature())
+        self.max_age = max_age
+        # _lock guards the fields below and is held only briefly; _load_lock
+        # lets one session reload while the others wait for its result
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._catalog: Optional[Catalog] = None
+        self._loaded_signature: Any = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._generation = 0         # bumped by bump_version()
+        self._loaded_generation = 0  # generation the snapshot was loaded at
+        self.hits = 0
+        self.misses = 0
+
+    def _is_fresh(self, signature: Any) -> bool:
+        if self._catalog is None or self._loaded_generation != self._generation:
+            return False
+        if signature != self._loaded_signature:
+            return False
+        return time.monotonic() - self._loaded_at < self.max_age
+
+    def _cached(self, signature: Any, force_refresh: bool) -> Optional[Catalog]:
+        with self._lock:
+            if not force_refresh and self._is_fresh(signature):
+                self.hits += 1
+                return self._catalog
+            return None
+
+    def get(self, force_refresh: bool = False) -> Catalog:
+        signature = self._signature()
+        catalog = self._cached(signature, force_refresh)
+        if catalog is not None:
+            return catalog
+        with self._load_lock:
+            # another session may have reloaded while we waited
+            catalog = self._cached(signature, force_refresh)
+            if catalog is not None:
+                return catalog
+            with self._lock:
+                self.misses += 1
+                generation = self._generation
+            medicines = [med for med in (self._loader() or []) if validate_medicine(med)]
+            with self._lock:
+                self._version += 1
+                self._catalog = Catalog(medicines, self._version)
+                self._loaded_signature = signature
+                self._loaded_at = time.monotonic()
+                # A bump during the load leaves the generations apart, so the next get() reloads
+                self._loaded_generation = generation
+                return self._catalog
+
+    def bump_version(self):
+        """Invalidate the snapshot; the next get() reloads it."""
+        with self._lock:
+            self._generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "version": self._version,
+            "size": len(self._catalog) if self._catalog is not None else 0,
+        }
+
+
+_catalog_cache = CatalogCache()
+
+
+def get_catalog_cache() -> CatalogCache:
+    return _catalog_cache
+
+
+def get_catalog(force_refresh: bool = False) -> Catalog:
+    return _catalog_cache.get(force_refresh)
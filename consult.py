@@ -1,6 +1,9 @@
 import streamlit as st
+from concurrent.futures import TimeoutError as FutureTimeout
 from datetime import datetime
-from utils import load_json, save_json, CONSULTS_FILE
+from storage import get_storage
+from utils import WRITE_QUEUE_RESULT_TIMEOUT
+from write_queue import get_write_queue
 
 def consult_doctor(username):
     st.header("Consult a Doctor")
@@ -12,7 +15,6 @@ def consult_doctor(username):
             if not symptoms.strip() or not preferred_time.strip():
                 st.warning("Please fill in all fields.")
             else:
-                consultations = load_json(CONSULTS_FILE)
                 consultation = {
                     "user": username,
                     "symptoms": symptoms,
@@ -20,13 +22,16 @@ def consult_doctor(username):
                     "datetime": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                     "status": "Requested"
                 }
-                consultations.append(consultation)
-                save_json(CONSULTS_FILE, consultations)
+                # Waits for the writer thread's batched commit
+                try:
+                    get_write_queue().submit_consultation(consultation).result(timeout=WRITE_QUEUE_RESULT_TIMEOUT)
+                except FutureTimeout:
+                    st.error("Saving your request is taking longer than usual. Please check your requests before trying again.")
+                    return
                 st.success("Consultation request submitted! A doctor will contact you soon.")
 
 def view_consultations(username):
-    consultations = load_json(CONSULTS_FILE)
-    user_consults = [c for c in consultations if c["user"] == username]
+    user_consults = get_storage().user_consultations(username)
     st.header("Your Consultation Requests")
     if not user_consults:
         st.info("No consultation requests yet.")
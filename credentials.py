@@ -0,0 +1,173 @@
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from storage import Storage, get_storage
+from utils import (
+    PASSWORD_HASH_SCHEME,
+    PASSWORD_QUEUE_LIMIT,
+    PASSWORD_WORKERS,
+    PBKDF2_ITERATIONS,
+    SCRYPT_COST,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMES = ("scrypt", "pbkdf2_sha256")
+SCHEME_FIELD = "password_scheme"  # set on every hashed record; absent means plaintext
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+class CredentialsBusy(RuntimeError):
+    """More password checks are waiting than PASSWORD_QUEUE_LIMIT allows."""
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def hash_password(password: str, scheme: str = PASSWORD_HASH_SCHEME,
+                  scrypt_cost: int = SCRYPT_COST, iterations: int = PBKDF2_ITERATIONS) -> str:
+    """Salted hash in the form "<scheme>$<params>$<salt>$<hash>" (runs in the calling thread)."""
+    salt = os.urandom(SALT_BYTES)
+    secret = password.encode("utf-8")
+    if scheme == "scrypt":
+        digest = hashlib.scrypt(secret, salt=salt, n=scrypt_cost, r=SCRYPT_R, p=SCRYPT_P,
+                                maxmem=256 * scrypt_cost * SCRYPT_R, dklen=KEY_BYTES)
+        return f"scrypt${scrypt_cost}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+    if scheme == "pbkdf2_sha256":
+        digest = hashlib.pbkdf2_hmac("sha256", secret, salt, iterations, dklen=KEY_BYTES)
+        return f"pbkdf2_sha256${iterations}${_b64(salt)}${_b64(digest)}"
+    raise ValueError(f"Unknown password hash scheme {scheme!r}, expected one of {SCHEMES}")
+
+
+def hash_fields(password: str, scheme: str = PASSWORD_HASH_SCHEME) -> Dict[str, str]:
+    """The "password" and "password_scheme" fields to store in a user record."""
+    return {"password": hash_password(password, scheme), SCHEME_FIELD: scheme}
+
+
+def verify_password(password: str, record: Dict[str, Any]) -> Tuple[bool, bool]:
+    """(matches, needs_rehash) for a user record's stored password.
+
+    Only records with a "password_scheme" field hold a hash; records without
+    one are legacy plaintext, whatever the stored string looks like.
+    needs_rehash is True for plaintext entries and for hashes made with a
+    different scheme or cost than the current configuration.
+    """
+    secret = password.encode("utf-8")
+    stored = str(record.get("password", ""))
+    scheme = record.get(SCHEME_FIELD)
+    if scheme is None:
+        return hmac.compare_digest(secret, stored.encode("utf-8")), True
+    parts = stored.split("$")
+    try:
+        if parts[0] != scheme:
+            raise ValueError(scheme)
+        if scheme == "scrypt":
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            salt, expected = base64.b64decode(parts[4]), base64.b64decode(parts[5])
+            digest = hashlib.scrypt(secret, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=len(expected))
+            current = PASSWORD_HASH_SCHEME == "scrypt" and (n, r, p) == (SCRYPT_COST, SCRYPT_R, SCRYPT_P)
+        elif scheme == "pbkdf2_sha256":
+            iterations = int(parts[1])
+            salt, expected = base64.b64decode(parts[2]), base64.b64decode(parts[3])
+            digest = hashlib.pbkdf2_hmac("sha256", secret, salt, iterations, dklen=len(expected))
+            current = PASSWORD_HASH_SCHEME == "pbkdf2_sha256" and iterations == PBKDF2_ITERATIONS
+        else:
+            raise ValueError(scheme)
+    except (ValueError, IndexError):
+        logger.warning("Malformed password hash")
+        return False, False
+    matches = hmac.compare_digest(digest, expected)
+    return matches, matches and not current
+
+
+class CredentialPool:
+    """Bounded worker pool for password hashing and verification.
+
+    The KDF takes tens of milliseconds of CPU, so it runs on worker threads
+    (hashlib releases the GIL while hashing) rather than inline. At most
+    `queue_limit` jobs may be waiting or running; beyond that submit()
+    raises CredentialsBusy straight away instead of growing the backlog.
+    """
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, queue_limit: int = PASSWORD_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="credentials")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+
+    def depth(self) -> int:
+        """Jobs waiting or running."""
+        return self._pending
+
+    def stats(self) -> Dict[str, int]:
+        return {"depth": self._pending, "workers": self.workers, "rejected": self._rejected}
+
+    def _done(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                self._rejected += 1
+                raise CredentialsBusy("Too many password checks in progress")
+            self._pending += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def hash(self, password: str) -> Dict[str, str]:
+        return self.submit(hash_fields, password).result()
+
+    def verify(self, password: str, record: Dict[str, Any]) -> Tuple[bool, bool]:
+        return self.submit(verify_password, password, record).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def authenticate(username: str, password: str, storage: Optional[Storage] = None,
+                 pool: Optional["CredentialPool"] = None) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """(user record or None if unknown, password ok).
+
+    A correct plaintext or outdated hash is replaced by a fresh hash; if that
+    write fails the login still succeeds and the rehash is retried next time.
+    Raises CredentialsBusy when the pool is saturated.
+    """
+    storage = storage or get_storage()
+    pool = pool or get_credential_pool()
+    record = storage.get_user(username)
+    if record is None:
+        return None, False
+    ok, needs_rehash = pool.verify(password, record)
+    if ok and needs_rehash:
+        try:
+            storage.update_user(username, dict(record, **pool.hash(password)))
+        except Exception:
+            logger.exception("Could not rehash the password for %s", username)
+    return record, ok
+
+
+_pool: Optional[CredentialPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_credential_pool() -> CredentialPool:
+    """Process-wide pool shared by every session."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = CredentialPool()
+        return _pool
@@ -4,6 +4,7 @@ from utils import rerun
 from medicines import show_medicines
 from orders import place_order, view_orders
 from consult import consult_doctor, view_consultations
+from cart import Cart, get_cart
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,7 +15,7 @@ def initialize_session():
     defaults = {
         "is_logged_in": False,
         "current_user": "",
-        "cart": [],
+        "cart": Cart(),
         "cart_quantities": {},
         "current_page": "landing",
         "user_preferences": {},
@@ -34,7 +35,7 @@ def clear_session():
     for key in keys_to_clear:
         if key in st.session_state:
             if key in ["cart", "cart_quantities", "user_preferences"]:
-                st.session_state[key] = {} if key != "cart" else []
+                st.session_state[key] = {} if key != "cart" else Cart()
             elif key == "dashboard_menu_selected":
                 st.session_state[key] = 0
             else:
@@ -321,7 +322,7 @@ def create_sidebar_menu():
     st.sidebar.markdown('<div class="sidebar-menu">', unsafe_allow_html=True)
     
     username = st.session_state.get("current_user", "Guest")
-    cart_count = len(st.session_state.get("cart", []))
+    cart_count = len(get_cart())
     
     # User info section
     st.sidebar.markdown(f"""
@@ -0,0 +1,92 @@
+from array import array
+from datetime import date, datetime
+from typing import Any, Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the pure-Python path gives the same answers
+    np = None
+
+EXPIRY_WARNING_DAYS = 30
+
+# Status codes returned by classify()
+FRESH = 0
+EXPIRING = 1
+EXPIRED = 2
+UNKNOWN = 3  # missing or unparseable expiry date
+
+NO_DATE = -1  # ordinal stored for missing or unparseable dates
+
+
+def parse_ordinal(value: Any) -> int:
+    """Day ordinal of a "YYYY-MM-DD" expiry date, or NO_DATE."""
+    if not isinstance(value, str):
+        return NO_DATE
+    try:
+        return date.fromisoformat(value).toordinal()
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date().toordinal()
+    except ValueError:
+        return NO_DATE
+
+
+def to_ordinal_array(expiry_dates: Iterable[Any]) -> Sequence[int]:
+    """Parse expiry dates once into a compact integer array."""
+    return ordinal_array(parse_ordinal(value) for value in expiry_dates)
+
+
+def ordinal_array(ordinals: Iterable[int]) -> Sequence[int]:
+    """Compact integer array of already-parsed day ordinals."""
+    ordinals = array("l", ordinals)
+    if np is not None:
+        return np.frombuffer(ordinals, dtype=np.dtype(ordinals.typecode)).astype(np.int32)
+    return ordinals
+
+
+def _today_ordinal(today: Optional[date]) -> int:
+    return (today or date.today()).toordinal()
+
+
+def days_until(ordinals: Sequence[int], today: Optional[date] = None) -> Sequence[int]:
+    """Days from `today` to each expiry; meaningless where the status is UNKNOWN."""
+    today_ordinal = _today_ordinal(today)
+    if np is not None and isinstance(ordinals, np.ndarray):
+        return ordinals - today_ordinal
+    return array("l", (ordinal - today_ordinal for ordinal in ordinals))
+
+
+def classify(ordinals: Sequence[int], today: Optional[date] = None,
+             warning_days: int = EXPIRY_WARNING_DAYS) -> Sequence[int]:
+    """Status code (FRESH/EXPIRING/EXPIRED/UNKNOWN) for every ordinal in one pass.
+
+    Expired means the expiry date is before `today`; expiring means it falls
+    within the next `warning_days` days, today included.
+    """
+    today_ordinal = _today_ordinal(today)
+    if np is not None and isinstance(ordinals, np.ndarray):
+        delta = ordinals - today_ordinal
+        return np.select(
+            [ordinals == NO_DATE, delta < 0, delta <= warning_days],
+            [UNKNOWN, EXPIRED, EXPIRING],
+            FRESH,
+        ).astype(np.int8)
+    codes = array("b")
+    for ordinal in ordinals:
+        if ordinal == NO_DATE:
+            codes.append(UNKNOWN)
+        elif ordinal < today_ordinal:
+            codes.append(EXPIRED)
+        elif ordinal - today_ordinal <= warning_days:
+            codes.append(EXPIRING)
+        else:
+            codes.append(FRESH)
+    return codes
+
+
+def classify_items(items: Iterable[Any], today: Optional[date] = None,
+                   warning_days: int = EXPIRY_WARNING_DAYS) -> List[int]:
+    """classify() for a list of medicines or cart lines carrying "expiry_date"."""
+    ordinals = to_ordinal_array(item.get("expiry_date") for item in items)
+    return list(classify(ordinals, today, warning_days))
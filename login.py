@@ -1,5 +1,14 @@
+import uuid
 import streamlit as st
-from utils import rerun, load_user_data
+from utils import rerun
+from credentials import authenticate, CredentialsBusy
+from throttle import get_login_throttle
+
+def _session_id():
+    # Survives logout, so a session cannot reset its login budget by signing out
+    if "throttle_id" not in st.session_state:
+        st.session_state["throttle_id"] = uuid.uuid4().hex
+    return st.session_state["throttle_id"]
 
 def login_page():
     
@@ -9,17 +18,23 @@ def login_page():
         username = st.text_input("Username", max_chars=20)
         password = st.text_input("Password", type="password", key="login_password")
         login_button = st.form_submit_button("Login")
-        # Always reload user data from file
-        st.session_state["user_data"] = load_user_data()
         if login_button:
             if not username or not password:
                 st.warning("⚠️ Please fill in all fields.")
-            elif username not in st.session_state["user_data"]:
+                return
+            if not get_login_throttle().allow(username, _session_id()):
+                st.error("⏳ Too many login attempts. Please wait a minute and try again.")
+                return
+            try:
+                user_info, password_ok = authenticate(username, password)
+            except CredentialsBusy:
+                st.error("⏳ Too many sign-ins right now. Please try again in a moment.")
+                return
+            if user_info is None:
                 st.error("❌ User not found.")
-            elif st.session_state["user_data"][username]["password"] != password:
+            elif not password_ok:
                 st.error("❌ Incorrect password.")
             else:
-                user_info = st.session_state["user_data"][username]
                 st.success(f"✅ Welcome back, **{username}**!")
                 st.session_state["is_logged_in"] = True
                 st.session_state["current_user"] = username
@@ -0,0 +1,148 @@
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Columns with a fixed layout; anything else a record carries goes to `extras`.
+CODED_FIELDS = ("category", "manufacturer", "expiry_date")  # few distinct values
+NUMERIC_FIELDS = ("id", "price", "stock")
+FLAG_FIELDS = ("requires_prescription",)
+FIELDS = ("id", "name", "description", "category", "manufacturer", "price", "stock",
+          "expiry_date", "requires_prescription")
+
+_ABSENT = object()
+
+
+def _numeric_column(values: List[Any]) -> Sequence:
+    """Typed array when every value shares one numeric type, else a plain list.
+
+    Mixed int/float columns stay lists so integer prices still print as "20".
+    """
+    if all(type(v) is int for v in values):
+        try:
+            return array("q", values)
+        except OverflowError:
+            return values
+    if all(type(v) is float for v in values):
+        return array("d", values)
+    return values
+
+
+class MedicineStore(Sequence):
+    """Struct-of-arrays catalog: one column per field instead of one dict per SKU.
+
+    Prices, stock and integer ids live in typed arrays; category, manufacturer
+    and expiry strings are interned once and referenced by small integer codes.
+    Indexing returns a MedicineView, which reads like the original dict.
+    """
+
+    def __init__(self, medicines: Iterable[Dict[str, Any]]):
+        columns: Dict[str, List[Any]] = {field: [] for field in FIELDS}
+        self.extras: Dict[int, Dict[str, Any]] = {}
+        self.codes: Dict[str, List[Any]] = {field: [_ABSENT] for field in CODED_FIELDS}
+        code_of: Dict[str, Dict[Any, int]] = {field: {} for field in CODED_FIELDS}
+        count = 0
+        for pos, med in enumerate(medicines):
+            count += 1
+            for field in FIELDS:
+                value = med.get(field, _ABSENT)
+                if field in CODED_FIELDS:
+                    if value is _ABSENT:
+                        value = 0
+                    else:
+                        lookup = code_of[field]
+                        code = lookup.get(value)
+                        if code is None:
+                            code = len(self.codes[field])
+                            lookup[value] = code
+                            self.codes[field].append(sys.intern(value) if isinstance(value, str) else value)
+                        value = code
+                columns[field].append(value)
+            extra = {key: value for key, value in med.items() if key not in FIELDS}
+            if extra:
+                self.extras[pos] = extra
+        self._len = count
+        self.columns: Dict[str, Sequence] = {}
+        for field in FIELDS:
+            values = columns[field]
+            if field in CODED_FIELDS:
+                self.columns[field] = array("I", values)
+            elif field in NUMERIC_FIELDS:
+                self.columns[field] = _numeric_column(values)
+            elif field in FLAG_FIELDS:
+                # 0 absent, 1 false, 2 true
+                self.columns[field] = bytearray(0 if v is _ABSENT else 1 + bool(v) for v in values)
+            else:
+                self.columns[field] = values
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [MedicineView(self, pos) for pos in range(*index.indices(self._len))]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError(index)
+        return MedicineView(self, index)
+
+    def value(self, pos: int, field: str, default: Any = _ABSENT) -> Any:
+        column = self.columns.get(field)
+        if column is None:
+            return self.extras.get(pos, {}).get(field, default)
+        if field in CODED_FIELDS:
+            value = self.codes[field][column[pos]]
+        elif field in FLAG_FIELDS:
+            flag = column[pos]
+            value = _ABSENT if flag == 0 else flag == 2
+        else:
+            value = column[pos]
+        return default if value is _ABSENT else value
+
+    def keys_at(self, pos: int) -> List[str]:
+        keys = [field for field in FIELDS if self.value(pos, field) is not _ABSENT]
+        keys.extend(self.extras.get(pos, ()))
+        return keys
+
+
+class MedicineView(Mapping):
+    """Read-only, dict-like view of one catalog row."""
+
+    __slots__ = ("_store", "_pos")
+
+    def __init__(self, store: MedicineStore, pos: int):
+        self._store = store
+        self._pos = pos
+
+    @property
+    def position(self) -> int:
+        return self._pos
+
+    @property
+    def store(self) -> MedicineStore:
+        return self._store
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._store.value(self._pos, key)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        return self._store.value(self._pos, key, default)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._store.value(self._pos, key) is not _ABSENT
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.keys_at(self._pos))
+
+    def __len__(self) -> int:
+        return len(self._store.keys_at(self._pos))
+
+    def __repr__(self):
+        return f"MedicineView({dict(self)!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self)
@@ -1,12 +1,13 @@
 import streamlit as st
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Sequence, Tuple
 import json
 from dataclasses import dataclass
-from utils import load_json, MEDICINES_FILE
+from catalog import get_catalog, get_catalog_cache, validate_medicine, SORT_KEYS, RELEVANCE
+from expiry import classify_items, parse_ordinal, EXPIRED, UNKNOWN, EXPIRY_WARNING_DAYS
+from cart import get_cart
 
 ITEMS_PER_PAGE = 20
-CACHE_DURATION = 300  # 5 minutes
 
 @dataclass
 class Medicine:
@@ -21,42 +22,34 @@ class Medicine:
     requires_prescription: bool = False
 
 class MedicineManager:
+    # The catalog itself is cached once per process (see catalog.py), so
+    # building a manager per rerun is cheap and every session shares the load.
     def __init__(self):
-        self._cache = {}
-        self._cache_time = {}
-
-    def _is_cache_valid(self, key: str) -> bool:
-        if key not in self._cache_time:
-            return False
-        return (datetime.now() - self._cache_time[key]).seconds < CACHE_DURATION
+        self._catalog = None
 
     def get_medicines(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
-        cache_key = "medicines"
-        if not force_refresh and self._is_cache_valid(cache_key):
-            return self._cache[cache_key]
         try:
-            medicines = load_json(MEDICINES_FILE)
-            if not medicines:
-                return []
-            valid_medicines = []
-            for med in medicines:
-                if self._validate_medicine(med):
-                    valid_medicines.append(med)
-            self._cache[cache_key] = valid_medicines
-            self._cache_time[cache_key] = datetime.now()
-            return valid_medicines
+            self._catalog = get_catalog(force_refresh)
+            return self._catalog.medicines
         except Exception as e:
             st.error(f"Error loading medicines: {str(e)}")
             return []
 
+    def cache_stats(self) -> Dict[str, Any]:
+        return get_catalog_cache().stats()
+
     def _validate_medicine(self, medicine: Dict[str, Any]) -> bool:
-        required_fields = ['name', 'price', 'stock','expiry_date']
-        return all(field in medicine for field in required_fields)
+        return validate_medicine(medicine)
 
     def filter_medicines(self, medicines: List[Dict[str, Any]],
                         search_term: str = "",
                         category: str = "All",
-                        in_stock_only: bool = True) -> List[Dict[str, Any]]:
+                        in_stock_only: bool = True,
+                        fuzzy: bool = False) -> List[Dict[str, Any]]:
+        if self._catalog is not None and medicines is self._catalog.medicines:
+            # Answered from the catalog's search and facet indexes; fuzzy
+            # results come back ordered by match score.
+            return self._catalog.filter(search_term, category, in_stock_only, fuzzy)
         filtered = []
         for med in medicines:
             # Search filter
@@ -71,16 +64,42 @@ class MedicineManager:
             filtered.append(med)
         return filtered
 
+    def query(self, medicines: List[Dict[str, Any]],
+              search_term: str = "",
+              category: str = "All",
+              in_stock_only: bool = True,
+              fuzzy: bool = False,
+              sort_by: str = "Name") -> Sequence[Dict[str, Any]]:
+        """Filtered medicines in `sort_by` order ("Relevance" keeps fuzzy score order)."""
+        if self._catalog is not None and medicines is self._catalog.medicines:
+            return self._catalog.query(search_term, category, in_stock_only, fuzzy, sort_by)
+        filtered = self.filter_medicines(medicines, search_term, category, in_stock_only, fuzzy)
+        if sort_by in SORT_KEYS:
+            key, descending = SORT_KEYS[sort_by]
+            filtered.sort(key=key, reverse=descending)
+        return filtered
+
+    def category_facets(self, in_stock_only: bool = False) -> List[Tuple[str, int]]:
+        if self._catalog is None:
+            return []
+        return self._catalog.category_facets(in_stock_only)
+
+    def expiry_info(self, medicine: Dict[str, Any], today: Optional[datetime.date] = None) -> Tuple[int, Optional[int]]:
+        """(expiry status code, days to expiry) from the catalog's precomputed arrays."""
+        if not today:
+            today = datetime.today().date()
+        pos = self._catalog.position_of(medicine) if self._catalog is not None else None
+        if pos is not None:
+            codes, days = self._catalog.expiry_status(today)
+            status = int(codes[pos])
+            return status, (None if status == UNKNOWN else int(days[pos]))
+        status = classify_items([medicine], today)[0]
+        if status == UNKNOWN:
+            return status, None
+        return status, parse_ordinal(medicine["expiry_date"]) - today.toordinal()
+
     def is_expired(self, medicine: Dict[str, Any], today: Optional[datetime.date] = None) -> bool:
-        try:
-            if "expiry_date" not in medicine:
-                return False
-            if not today:
-                today = datetime.today().date()
-            expiry_date = datetime.strptime(medicine["expiry_date"], "%Y-%m-%d").date()
-            return expiry_date < today
-        except (ValueError, TypeError):
-            return False
+        return self.expiry_info(medicine, today)[0] == EXPIRED
 
     def _matches_search(self, medicine: Dict[str, Any], search_term: str) -> bool:
         search_lower = search_term.lower()
@@ -205,7 +224,8 @@ def create_medicine_css():
         </style>
     """, unsafe_allow_html=True)
 
-def display_medicine_card(medicine: Dict[str, Any], expired: bool = False, show_expiry: bool = False):
+def display_medicine_card(medicine: Dict[str, Any], expired: bool = False, show_expiry: bool = False,
+                          days_to_expiry: Optional[int] = None):
     key = f"qty_{medicine.get('id', medicine.get('name', 'unknown'))}"
     default_qty = st.session_state.get("cart_quantities", {}).get(key, 0)
 
@@ -266,15 +286,18 @@ def display_medicine_card(medicine: Dict[str, Any], expired: bool = False, show_
     # Expiry date info (always show if requested, else show warnings for expired/expiring)
     if medicine.get("expiry_date"):
         try:
-            expiry_date = datetime.strptime(medicine["expiry_date"], "%Y-%m-%d").date()
-            days_to_expiry = (expiry_date - datetime.today().date()).days
-            if show_expiry or expired or days_to_expiry <= 30:
+            if days_to_expiry is None:
+                expiry_date = datetime.strptime(medicine["expiry_date"], "%Y-%m-%d").date()
+                days_to_expiry = (expiry_date - datetime.today().date()).days
+            else:
+                expiry_date = medicine["expiry_date"]
+            if show_expiry or expired or days_to_expiry <= EXPIRY_WARNING_DAYS:
                 if expired:
                     st.markdown(
                         f'<div class="not avalable-warning">❌ medicine is not avalable </div>',
                         unsafe_allow_html=True
                     )
-                elif days_to_expiry <= 30:
+                elif days_to_expiry <= EXPIRY_WARNING_DAYS:
                     st.markdown(
                         f'<div class="not avalable">⚠️ Expires in {days_to_expiry} days ({expiry_date})</div>',
                         unsafe_allow_html=True
@@ -292,38 +315,38 @@ def display_medicine_card(medicine: Dict[str, Any], expired: bool = False, show_
     st.markdown('</div>', unsafe_allow_html=True)
 
 def add_selected_to_cart(medicines: List[Dict[str, Any]], medicine_manager: MedicineManager):
-    cart_items = []
+    cart = get_cart()
+    quantities = st.session_state.get("cart_quantities", {})
+    added = 0
     today = datetime.today().date()
     for med in medicines:
         key = f"qty_{med.get('id', med.get('name', 'unknown'))}"
-        qty = st.session_state.get("cart_quantities", {}).get(key, 0)
+        qty = quantities.get(key, 0)
         expired = medicine_manager.is_expired(med, today)
         if expired:
             continue
         if qty > 0:
-            existing_item = next((item for item in st.session_state["cart"]
-                                if item.get("id") == med.get("id")), None)
-            if existing_item:
-                existing_item["qty"] += qty
-            else:
-                cart_items.append({
-                    "id": med.get("id", ""),
+            # Merges into an existing line for the same id in O(1)
+            try:
+                cart.add({
+                    "id": med.get("id"),
                     "name": med.get("name", ""),
                     "price": med.get("price", 0),
                     "qty": qty,
                     "category": med.get("category", "Other"),
                     "expiry_date": med.get("expiry_date", None)  # ensure expiry is in cart entry
                 })
-    if cart_items:
-        st.session_state["cart"].extend(cart_items)
-        st.success(f"🛒 Added {len(cart_items)} item(s) to cart!")
-        total_items = sum(item.get("qty", 0) for item in st.session_state["cart"])
-        total_price = sum(item.get("price", 0) * item.get("qty", 0) for item in st.session_state["cart"])
+            except ValueError as e:
+                st.warning(str(e))
+                continue
+            added += 1
+    if added:
+        st.success(f"🛒 Added {added} item(s) to cart!")
         st.markdown(f"""
             <div class="cart-summary">
                 <strong>🛒 Cart Summary:</strong><br>
-                Items: {total_items}<br>
-                Total: ₹{total_price:.2f}
+                Items: {cart.total_qty}<br>
+                Total: ₹{cart.total_amount:.2f}
             </div>
         """, unsafe_allow_html=True)
     else:
@@ -345,28 +368,39 @@ def show_medicines(show_expiry=False):
             key="enhanced_search",
             help="Search across medicine name, description, manufacturer, and category"
         )
+        fuzzy_search = st.checkbox(
+            "🔤 Typo-tolerant search",
+            key="enhanced_fuzzy",
+            help="Also match misspellings such as 'paracetmol', best matches first"
+        )
     with col2:
         if st.button("🔄 Refresh Data", help="Refresh medicine data"):
             medicine_manager.get_medicines(force_refresh=True)
             st.experimental_rerun()
-    categories = ["All"] + sorted(set(med.get("category", "Other") for med in medicines))
+    # Counts cover the whole catalog so the labels (and widget identity) only
+    # change with the catalog version, not with every filter toggle.
+    facet_counts = dict(medicine_manager.category_facets())
+    categories = ["All"] + list(facet_counts)
     col1, col2, col3 = st.columns([2, 2, 1])
     with col1:
-        category_filter = st.selectbox("📂 Category", categories, key="enhanced_category")
+        category_filter = st.selectbox(
+            "📂 Category",
+            categories,
+            format_func=lambda c: c if c == "All" else f"{c} ({facet_counts[c]})",
+            key="enhanced_category"
+        )
     with col2:
         in_stock_only = st.checkbox("📦 In Stock Only", value=True, key="enhanced_stock")
     with col3:
-        sort_by = st.selectbox("🔄 Sort By", ["Name", "Price", "Stock"], key="sort_by")
+        sort_options = list(SORT_KEYS)
+        if fuzzy_search and search_term:
+            sort_options.insert(0, RELEVANCE)
+        sort_by = st.selectbox("🔄 Sort By", sort_options, key="sort_by")
     st.markdown('</div>', unsafe_allow_html=True)
-    filtered_medicines = medicine_manager.filter_medicines(
-        medicines, search_term, category_filter, in_stock_only
+    # Ordered from the catalog's presorted views; paging below is a slice
+    filtered_medicines = medicine_manager.query(
+        medicines, search_term, category_filter, in_stock_only, fuzzy=fuzzy_search, sort_by=sort_by
     )
-    if sort_by == "Price":
-        filtered_medicines.sort(key=lambda x: x.get("price", 0))
-    elif sort_by == "Stock":
-        filtered_medicines.sort(key=lambda x: x.get("stock", 0), reverse=True)
-    else:  # Name
-        filtered_medicines.sort(key=lambda x: x.get("name", ""))
     st.markdown(f"**Found {len(filtered_medicines)} medicine(s)**")
     if not filtered_medicines:
         st.info("🔍 No medicines match your search criteria. Try adjusting your filters.")
@@ -379,11 +413,11 @@ def show_medicines(show_expiry=False):
         page_medicines = filtered_medicines[start_idx:end_idx]
         st.info(f"Showing {start_idx + 1}-{min(end_idx, len(filtered_medicines))} of {len(filtered_medicines)} medicines")
     else:
-        page_medicines = filtered_medicines
+        page_medicines = list(filtered_medicines)
     today = datetime.today().date()
     for med in page_medicines:
-        expired = medicine_manager.is_expired(med, today)
-        display_medicine_card(med, expired=expired, show_expiry=show_expiry)
+        status, days_to_expiry = medicine_manager.expiry_info(med, today)
+        display_medicine_card(med, expired=status == EXPIRED, show_expiry=show_expiry, days_to_expiry=days_to_expiry)
     st.markdown("---")
     col1, col2 = st.columns([2, 1])
     with col1:
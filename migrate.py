@@ -0,0 +1,187 @@
+"""Bulk-load the flat JSON files into a SQLite store.
+
+    python migrate.py --db medicare.db
+
+Every source is streamed and written in batches. After each batch the
+position reached in every source is saved to a checkpoint file, so an
+interrupted run picks up where it stopped: appended orders and
+consultations past the last checkpoint are rolled back first, so nothing is
+loaded twice. Rejected records go to a JSON-lines file with their source
+and position; it is cut back to its checkpointed length on resume as well.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from catalog import validate_medicine
+from order_archive import OrderArchive, get_order_archive
+from order_journal import META_KEY, OrderJournal, get_order_journal, parse_line
+from storage import SqliteStorage
+from user_directory import UserDirectory, get_user_directory
+from utils import (
+    iter_json,
+    load_json,
+    save_json,
+    CONSULTS_FILE,
+    MEDICINES_FILE,
+    SQLITE_DB_FILE,
+)
+
+BATCH_SIZE = 5000
+CHECKPOINT_FILE = "migration_checkpoint.json"
+REJECTS_FILE = "migration_rejects.jsonl"
+
+
+def _counted(records, done: int) -> Iterator[Tuple[int, Any]]:
+    # JSON arrays have no cheap byte offsets, so resuming re-reads (but does not re-write) the prefix
+    for position, record in enumerate(islice(records, done, None), done + 1):
+        yield position, record
+
+
+def _journal_from(path: str, offset: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Journal orders from a byte offset, with the offset just past each one."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            record = parse_line(line, path, offset)
+            offset += len(line)
+            if record is not None and META_KEY not in record:
+                yield offset, record
+
+
+def _valid_user(item) -> bool:
+    username, record = item
+    return isinstance(username, str) and bool(username) and isinstance(record, dict)
+
+
+def _valid_medicine(record) -> bool:
+    # A NULL id is never replaced, so it would be inserted again on resume
+    return isinstance(record, dict) and validate_medicine(record) and record.get("id") is not None
+
+
+def _valid_order(record) -> bool:
+    return isinstance(record, dict) and bool(record.get("user")) and isinstance(record.get("items"), list)
+
+
+def _valid_consultation(record) -> bool:
+    return isinstance(record, dict) and bool(record.get("user"))
+
+
+def sources(target: SqliteStorage, journal: OrderJournal, archive: OrderArchive,
+            users: UserDirectory) -> List[Tuple[str, Callable, Callable, Callable]]:
+    """(name, read(position), validate(record), write(batch)) for each source, in load order."""
+    generation = journal.archive_generation()
+    legacy = journal.legacy_path if journal.legacy_path and not journal.legacy_migrated() else None
+    return [
+        ("users", lambda done: _counted(users.items(), done), _valid_user,
+         lambda batch: target.add_users(dict(batch))),
+        ("medicines", lambda done: _counted(iter_json(MEDICINES_FILE), done), _valid_medicine,
+         target.save_medicines),
+        # Orders oldest first: legacy array, compacted archive, then the journal
+        ("orders_legacy", lambda done: _counted(iter_json(legacy) if legacy else iter(()), done), _valid_order,
+         target.append_orders),
+        ("orders_archive", lambda done: _counted(archive.iter_orders(generation), done), _valid_order,
+         target.append_orders),
+        ("orders_journal", lambda offset: _journal_from(journal.path, offset), _valid_order,
+         target.append_orders),
+        ("consultations", lambda done: _counted(iter_json(CONSULTS_FILE), done), _valid_consultation,
+         target.append_consultations),
+    ]
+
+
+def migrate(target: SqliteStorage, checkpoint_path: str = CHECKPOINT_FILE,
+            rejects_path: str = REJECTS_FILE, batch_size: int = BATCH_SIZE,
+            journal: Optional[OrderJournal] = None, archive: Optional[OrderArchive] = None,
+            users: Optional[UserDirectory] = None,
+            report: Callable[[str], None] = print) -> Dict[str, Dict[str, Any]]:
+    """Load every source into `target`, resuming from `checkpoint_path` if present."""
+    journal = journal or get_order_journal()
+    archive = archive or get_order_archive()
+    users = users if users is not None else get_user_directory()
+    if os.path.exists(checkpoint_path):
+        checkpoint = load_json(checkpoint_path)
+        target.truncate_to(checkpoint["marks"])
+    else:
+        rejects_size = os.path.getsize(rejects_path) if os.path.exists(rejects_path) else 0
+        checkpoint = {"marks": target.row_marks(), "rejects_size": rejects_size, "sources": {}}
+        save_json(checkpoint_path, checkpoint)
+
+    with open(rejects_path, "a") as rejects:
+        if "rejects_size" in checkpoint:
+            # Drop rejects logged for batches that were rolled back above
+            rejects.truncate(checkpoint["rejects_size"])
+        for name, read, validate, write in sources(target, journal, archive, users):
+            state = checkpoint["sources"].setdefault(
+                name, {"position": 0, "rows": 0, "rejected": 0, "done": False})
+            if state["done"]:
+                continue
+            started = time.perf_counter()
+            rows_before = state["rows"]
+
+            def commit(batch, position, rejected):
+                if batch:
+                    write(batch)
+                state["position"] = position
+                state["rows"] += len(batch)
+                state["rejected"] += rejected
+                rejects.flush()
+                checkpoint["marks"] = target.row_marks()
+                checkpoint["rejects_size"] = os.fstat(rejects.fileno()).st_size
+                save_json(checkpoint_path, checkpoint)
+                rows = state["rows"] - rows_before
+                rate = rows / max(time.perf_counter() - started, 1e-9)
+                report(f"{name}: {state['rows']} rows, {state['rejected']} rejected ({rate:,.0f} rows/s)")
+
+            batch, seen, rejected = [], 0, 0
+            position = state["position"]
+            for position, record in read(state["position"]):
+                seen += 1
+                if validate(record):
+                    batch.append(record)
+                else:
+                    rejected += 1
+                    rejects.write(json.dumps({"source": name, "position": position, "record": record}) + "\n")
+                if seen >= batch_size:
+                    commit(batch, position, rejected)
+                    batch, seen, rejected = [], 0, 0
+            if seen:
+                commit(batch, position, rejected)
+            state["done"] = True
+            save_json(checkpoint_path, checkpoint)
+    return checkpoint["sources"]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Stream the JSON files into a SQLite store")
+    parser.add_argument("--db", default=SQLITE_DB_FILE)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--rejects", default=REJECTS_FILE)
+    args = parser.parse_args(argv)
+
+    target = SqliteStorage(args.db, seed=False)
+    if not os.path.exists(args.checkpoint) and any(target.row_marks().values()):
+        print(f"{args.db} already holds orders or consultations; migrate into an empty database")
+        return 1
+    resumed = load_json(args.checkpoint)["sources"] if os.path.exists(args.checkpoint) else {}
+    rows_before = sum(state["rows"] for state in resumed.values())
+    started = time.perf_counter()
+    result = migrate(target, args.checkpoint, args.rejects, args.batch_size)
+    elapsed = time.perf_counter() - started
+    rows = sum(state["rows"] for state in result.values()) - rows_before
+    rejected = sum(state["rejected"] for state in result.values())
+    print(f"Done: {rows} rows this run in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s), "
+          f"{rejected} rejected in total (see {args.rejects})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import argparse
+import gzip
+import json
+import lzma
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from order_journal import META_KEY, OrderJournal, get_order_journal
+from utils import (
+    save_json,
+    ORDER_ARCHIVE_CODEC,
+    ORDER_ARCHIVE_DIR,
+    ORDER_ARCHIVE_MAX_AGE_DAYS,
+)
+
+CODECS = {"gzip": (gzip.open, ".gz"), "lzma": (lzma.open, ".xz")}
+MANIFEST_FILE = "manifest.json"
+
+
+class OrderArchive:
+    """Compressed monthly segments of compacted orders, described by a manifest.
+
+    The manifest lists each segment's month, order count, date range and
+    per-user counts, so history readers can total a user's orders and skip
+    whole segments without opening them. A segment belongs to a compaction
+    generation and only counts once the journal has switched to that
+    generation, which keeps an interrupted compaction from showing orders
+    twice.
+    """
+
+    def __init__(self, root: str = ORDER_ARCHIVE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._manifest: Dict[str, Any] = {"segments": []}
+        self._signature = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def load_manifest(self) -> Dict[str, Any]:
+        """The manifest, re-read only when the file changed."""
+        try:
+            stat = os.stat(self.manifest_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
+        with self._lock:
+            if signature != self._signature:
+                if signature is None:
+                    self._manifest = {"segments": []}
+                else:
+                    with open(self.manifest_path) as f:
+                        self._manifest = json.load(f)
+                self._signature = signature
+            return self._manifest
+
+    def segments(self, generation: int) -> List[Dict[str, Any]]:
+        """Segments visible to a journal at `generation`, oldest first."""
+        visible = [s for s in self.load_manifest()["segments"] if s["generation"] <= generation]
+        visible.sort(key=lambda s: (s["month"], s["generation"]))
+        return visible
+
+    def iter_segment(self, segment: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        opener, _ = CODECS[segment["codec"]]
+        with opener(os.path.join(self.root, segment["file"]), "rb") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def iter_orders(self, generation: int) -> Iterator[Dict[str, Any]]:
+        for segment in self.segments(generation):
+            yield from self.iter_segment(segment)
+
+    def user_count(self, username: str, generation: int) -> int:
+        return sum(s["users"].get(username, 0) for s in self.segments(generation))
+
+    def user_orders_page(self, username: str, start: int, limit: Optional[int],
+                         generation: int) -> List[Dict[str, Any]]:
+        """A user's archived orders, newest first, opening only the segments on the page."""
+        page: List[Dict[str, Any]] = []
+        skip = start
+        for segment in reversed(self.segments(generation)):
+            count = segment["users"].get(username, 0)
+            if not count:
+                continue
+            if skip >= count:
+                skip -= count
+                continue
+            orders = [o for o in self.iter_segment(segment) if o.get("user") == username]
+            orders.reverse()
+            stop = None if limit is None else skip + limit - len(page)
+            page.extend(orders[skip:stop])
+            skip = 0
+            if limit is not None and len(page) >= limit:
+                break
+        return page
+
+
+class _SegmentWriter:
+    def __init__(self, archive: OrderArchive, month: str, generation: int, codec: str):
+        opener, ext = CODECS[codec]
+        self.entry = {"file": f"{month}.g{generation:04d}.jsonl{ext}", "month": month,
+                      "generation": generation, "codec": codec, "count": 0,
+                      "first": None, "last": None, "users": {}}
+        self.path = os.path.join(archive.root, self.entry["file"])
+        self._raw = open(self.path, "wb")
+        self._out = opener(self._raw, "wb")
+
+    def write(self, order: Dict[str, Any]):
+        self._out.write((json.dumps(order, separators=(",", ":")) + "\n").encode("utf-8"))
+        entry, when, user = self.entry, order.get("datetime"), order.get("user")
+        entry["count"] += 1
+        entry["first"] = when if entry["first"] is None else min(entry["first"], when)
+        entry["last"] = when if entry["last"] is None else max(entry["last"], when)
+        entry["users"][user] = entry["users"].get(user, 0) + 1
+
+    def close(self):
+        self._out.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+
+
+def compact_orders(journal: OrderJournal, archive: OrderArchive,
+                   max_age_days: int = ORDER_ARCHIVE_MAX_AGE_DAYS,
+                   codec: str = ORDER_ARCHIVE_CODEC,
+                   now: Optional[datetime] = None) -> Dict[str, int]:
+    """Move journal orders older than `max_age_days` into monthly archive segments.
+
+    The journal is rewritten with only the recent orders under its file lock,
+    so checkouts in any process wait for the swap rather than racing it.
+    Segments are written and fsynced, then the manifest, and the journal is
+    replaced last; its marker line names the new generation.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown archive codec {codec!r}, expected one of {tuple(CODECS)}")
+    if journal.legacy_path and os.path.exists(journal.legacy_path) and not journal.legacy_migrated():
+        raise RuntimeError(f"Migrate {journal.legacy_path} into the journal first "
+                           f"(python order_journal.py migrate)")
+    cutoff = ((now or datetime.now()) - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+    os.makedirs(archive.root, exist_ok=True)
+    with journal.rewrite():
+        meta = journal.meta()
+        generation = meta.get("archive_generation", 0) + 1
+        manifest = dict(archive.load_manifest())
+        # Segments from an interrupted run that the journal never switched to
+        segments = []
+        for segment in manifest["segments"]:
+            if segment["generation"] >= generation:
+                path = os.path.join(archive.root, segment["file"])
+                if os.path.exists(path):
+                    os.remove(path)
+            else:
+                segments.append(segment)
+
+        writers: Dict[str, _SegmentWriter] = {}
+        tmp_path = journal.path + ".compact.tmp"
+        archived = kept = 0
+        try:
+            with open(tmp_path, "w") as hot:
+                marker = dict(meta) if meta else {META_KEY: "compacted"}
+                marker["archive_generation"] = generation
+                hot.write(json.dumps(marker) + "\n")
+                for order in journal.iter_journal():
+                    when = order.get("datetime")
+                    if isinstance(when, str) and len(when) >= 7 and when < cutoff:
+                        month = when[:7]
+                        writer = writers.get(month)
+                        if writer is None:
+                            writer = writers[month] = _SegmentWriter(archive, month, generation, codec)
+                        writer.write(order)
+                        archived += 1
+                    else:
+                        hot.write(json.dumps(order, separators=(",", ":")) + "\n")
+                        kept += 1
+                hot.flush()
+                os.fsync(hot.fileno())
+            for writer in writers.values():
+                writer.close()
+        except BaseException:
+            for writer in writers.values():
+                if os.path.exists(writer.path):
+                    os.remove(writer.path)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if not archived:
+            os.remove(tmp_path)
+            return {"archived": 0, "kept": kept, "segments": 0}
+        manifest["segments"] = segments + [writer.entry for writer in writers.values()]
+        save_json(archive.manifest_path, manifest)
+        os.replace(tmp_path, journal.path)
+    return {"archived": archived, "kept": kept, "segments": len(writers)}
+
+
+_archive: Optional[OrderArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_order_archive() -> OrderArchive:
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = OrderArchive()
+        return _archive
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compact old orders into compressed monthly archives")
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("--days", type=int, default=ORDER_ARCHIVE_MAX_AGE_DAYS,
+                        help="archive orders older than this many days")
+    parser.add_argument("--codec", choices=sorted(CODECS), default=ORDER_ARCHIVE_CODEC)
+    args = parser.parse_args(argv)
+    result = compact_orders(get_order_journal(), get_order_archive(), args.days, args.codec)
+    print(f"Archived {result['archived']} order(s) into {result['segments']} segment(s); "
+          f"{result['kept']} remain in the journal")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
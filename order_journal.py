@@ -0,0 +1,384 @@
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils import (
+    file_lock,
+    iter_json,
+    ORDERS_FILE,
+    ORDERS_JOURNAL_FILE,
+    ORDER_JOURNAL_FSYNC,
+    ORDER_JOURNAL_FSYNC_INTERVAL,
+)
+
+FSYNC_POLICIES = ("always", "interval", "never")
+META_KEY = "_meta"
+
+logger = logging.getLogger(__name__)
+
+
+def parse_line(line: bytes, path: str, offset: int) -> Optional[Dict[str, Any]]:
+    """One committed journal line, or None (logged) if it is not valid JSON."""
+    try:
+        return json.loads(line)
+    except ValueError:
+        logger.warning("Skipping unreadable line at byte %d of %s", offset, path)
+        return None
+
+
+def trim_torn_tail(fd: int) -> int:
+    """Cut a partial last line left by a crashed writer; returns the file size.
+
+    Call with the file lock held and `fd` opened for reading and writing.
+    """
+    size = os.fstat(fd).st_size
+    if size == 0 or os.pread(fd, 1, size - 1) == b"\n":
+        return size
+    end = size
+    while end > 0:
+        start = max(0, end - 65536)
+        newline = os.pread(fd, end - start, start).rfind(b"\n")
+        if newline != -1:
+            end = start + newline + 1
+            break
+        end = start
+    os.ftruncate(fd, end)
+    return end
+
+
+class OrderJournal:
+    """Append-only JSON-lines order log that also reads the legacy orders.json array.
+
+    Each order is one line, so placing an order costs a single O_APPEND write
+    regardless of how many orders came before it. Under the "interval" fsync
+    policy an append inside the interval is fsynced by a timer at its end,
+    so the last orders before a quiet spell are not left unsynced.
+    """
+
+    def __init__(self, path: str = ORDERS_JOURNAL_FILE,
+                 legacy_path: Optional[str] = ORDERS_FILE,
+                 fsync: str = ORDER_JOURNAL_FSYNC,
+                 fsync_interval: float = ORDER_JOURNAL_FSYNC_INTERVAL):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}, expected one of {FSYNC_POLICIES}")
+        self.path = path
+        self.legacy_path = legacy_path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._last_fsync = 0.0
+        self._sync_timer: Optional[threading.Timer] = None
+        self._exiting = False
+        self.index = OrderIndex(self)
+
+    def _open(self) -> int:
+        if self._fd is not None:
+            # Another process may have replaced the journal (migration); reopen by path
+            try:
+                current = os.path.samestat(os.fstat(self._fd), os.stat(self.path))
+            except FileNotFoundError:
+                current = False
+            if not current:
+                os.close(self._fd)
+                self._fd = None
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _sync(self, fd: int):
+        if self.fsync == "never":
+            return
+        now = time.monotonic()
+        if self.fsync == "interval" and not self._exiting and now - self._last_fsync < self.fsync_interval:
+            if self._sync_timer is None:
+                self._sync_timer = threading.Timer(self._last_fsync + self.fsync_interval - now, self._deadline_sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+            return
+        os.fsync(fd)
+        self._last_fsync = now
+
+    def _deadline_sync(self):
+        with self._lock:
+            if self._sync_timer is threading.current_thread():
+                self._sync_timer = None
+            if self._fd is not None:
+                os.fsync(self._fd)
+                self._last_fsync = time.monotonic()
+
+    def append(self, order: Dict[str, Any]) -> int:
+        """Append one order and return the byte offset of its line."""
+        return self.append_many([order])[0]
+
+    def append_many(self, orders: Iterable[Dict[str, Any]]) -> List[int]:
+        """Append orders with a single write (and at most one fsync); return their offsets."""
+        orders = list(orders)
+        lines = [(json.dumps(order, separators=(",", ":")) + "\n").encode("utf-8") for order in orders]
+        if not lines:
+            return []
+        data = b"".join(lines)
+        # The file lock keeps other processes' batches from interleaving with a partial write
+        with self._lock, file_lock(self.path):
+            fd = self._open()
+            # Otherwise this write would be glued onto the fragment and unreadable
+            trim_torn_tail(fd)
+            written = 0
+            while written < len(data):
+                written += os.write(fd, data[written:])
+            end = os.lseek(fd, 0, os.SEEK_CUR)
+            self._sync(fd)
+            offsets = []
+            offset = end - len(data)
+            for line in lines:
+                offsets.append(offset)
+                offset += len(line)
+            self.index.record(orders, offsets, end)
+        return offsets
+
+    def flush(self):
+        """Force an fsync regardless of policy."""
+        with self._lock:
+            if self._fd is not None:
+                os.fsync(self._fd)
+                self._last_fsync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+    def shutdown(self):
+        """Close at interpreter exit; appends still arriving after it are fsynced at once."""
+        self._exiting = True
+        self.close()
+
+    @contextmanager
+    def rewrite(self) -> Iterator[None]:
+        """Keep every appender, in this process or another, out while the file is replaced.
+
+        Takes the thread lock and then the file lock, the order append_many
+        uses, and closes the fd so the next append opens the new file.
+        """
+        with self._lock, file_lock(self.path):
+            self._close_locked()
+            yield
+
+    def _close_locked(self):
+        # Caller holds self._lock
+        if self._sync_timer is not None:
+            self._sync_timer.cancel()
+            self._sync_timer = None
+        if self._fd is not None:
+            if self.fsync != "never":
+                os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    def meta(self) -> Dict[str, Any]:
+        """The journal's leading marker line (migration, compaction), or {}."""
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "rb") as f:
+            first = f.readline()
+        try:
+            record = json.loads(first)
+        except ValueError:
+            return {}
+        return record if isinstance(record, dict) and META_KEY in record else {}
+
+    def legacy_migrated(self) -> bool:
+        """True when the journal starts with a migration marker for the legacy file."""
+        return self.meta().get(META_KEY) == "migrated"
+
+    def archive_generation(self) -> int:
+        """Number of the last compaction folded into this journal (0 if none)."""
+        return self.meta().get("archive_generation", 0)
+
+    def iter_legacy(self) -> Iterator[Dict[str, Any]]:
+        if not self.legacy_path or not os.path.exists(self.legacy_path) or self.legacy_migrated():
+            return
+        yield from iter_json(self.legacy_path)
+
+    def iter_journal(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # torn tail from an interrupted write, not yet a committed order
+                    break
+                record = parse_line(line, self.path, offset)
+                offset += len(line)
+                if record is None or META_KEY in record:
+                    continue
+                yield record
+
+    def iter_orders(self) -> Iterator[Dict[str, Any]]:
+        """Yield every order, legacy array first, in placement order."""
+        yield from self.iter_legacy()
+        yield from self.iter_journal()
+
+
+class OrderIndex:
+    """Byte offsets of each user's orders in an OrderJournal.
+
+    Orders still in an unmigrated legacy array are kept as records. The index
+    is built by one scan on first use and extended on every append through
+    this process's journal; appends from other processes are picked up by
+    scanning on from the last indexed byte. Reading a page seeks to just the
+    lines on that page.
+    """
+
+    def __init__(self, journal: OrderJournal):
+        self.journal = journal
+        self._lock = threading.Lock()
+        self._built = False
+        self._file_id = None
+        self._end = 0
+        self._legacy: Dict[str, List[Dict[str, Any]]] = {}
+        self._offsets: Dict[str, array] = {}
+
+    def _add(self, username: str, offset: int):
+        offsets = self._offsets.get(username)
+        if offsets is None:
+            offsets = self._offsets[username] = array("q")
+        offsets.append(offset)
+
+    def _reset(self, file_id):
+        self._built = True
+        self._file_id = file_id
+        self._end = 0
+        self._offsets = {}
+        self._legacy = {}
+        for order in self.journal.iter_legacy():
+            self._legacy.setdefault(order.get("user"), []).append(order)
+
+    def _catch_up(self):
+        try:
+            stat = os.stat(self.journal.path)
+        except FileNotFoundError:
+            stat = None
+        file_id = (stat.st_dev, stat.st_ino) if stat else None
+        # A replaced or truncated journal (e.g. after migration) is re-indexed from scratch
+        if not self._built or file_id != self._file_id or (stat and stat.st_size < self._end):
+            self._reset(file_id)
+        if stat is None or stat.st_size == self._end:
+            return
+        with open(self.journal.path, "rb") as f:
+            f.seek(self._end)
+            offset = self._end
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                record = parse_line(line, self.journal.path, offset)
+                if record is not None and META_KEY not in record:
+                    self._add(record.get("user"), offset)
+                offset += len(line)
+        self._end = offset
+
+    def record(self, orders: List[Dict[str, Any]], offsets: List[int], end: int):
+        """Index orders just appended at `offsets`; called by the journal under its lock."""
+        with self._lock:
+            if not self._built or offsets[0] != self._end:
+                return  # unbuilt, or another process wrote in between: _catch_up covers it
+            for order, offset in zip(orders, offsets):
+                self._add(order.get("user"), offset)
+            self._end = end
+
+    def user_orders_page(self, username: str, start: int = 0,
+                         limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """(orders, total) for one user, newest first, reading only the requested page."""
+        with self._lock:
+            self._catch_up()
+            legacy = self._legacy.get(username, [])
+            offsets = self._offsets.get(username, ())
+            total = len(legacy) + len(offsets)
+            stop = total if limit is None else min(total, start + limit)
+            # newest-first index i is position total - 1 - i in placement order
+            positions = [total - 1 - i for i in range(start, stop)]
+            if not positions:
+                return [], total
+            orders = []
+            f = open(self.journal.path, "rb") if positions[0] >= len(legacy) else None
+            try:
+                for pos in positions:
+                    if pos < len(legacy):
+                        orders.append(legacy[pos])
+                    else:
+                        f.seek(offsets[pos - len(legacy)])
+                        orders.append(json.loads(f.readline()))
+            finally:
+                if f is not None:
+                    f.close()
+            return orders, total
+
+    def user_order_count(self, username: str) -> int:
+        with self._lock:
+            self._catch_up()
+            return len(self._legacy.get(username, ())) + len(self._offsets.get(username, ()))
+
+
+def migrate_legacy_orders(journal: "OrderJournal") -> int:
+    """Fold the legacy orders.json array into the journal; returns the number of orders moved.
+
+    The rewritten journal starts with a marker line, so readers ignore the legacy
+    file from that point on and re-running the migration is a no-op. Run it while
+    no checkout is in progress.
+    """
+    if not journal.legacy_path or not os.path.exists(journal.legacy_path) or journal.legacy_migrated():
+        return 0
+    with journal.rewrite():
+        # Two streaming passes (count, then copy) instead of loading the array
+        count = sum(1 for _ in iter_json(journal.legacy_path))
+        tmp_path = journal.path + ".tmp"
+        with open(tmp_path, "w") as out:
+            marker = {META_KEY: "migrated", "source": journal.legacy_path, "count": count}
+            if journal.archive_generation():
+                marker["archive_generation"] = journal.archive_generation()
+            out.write(json.dumps(marker) + "\n")
+            for order in iter_json(journal.legacy_path):
+                out.write(json.dumps(order, separators=(",", ":")) + "\n")
+            for order in journal.iter_journal():
+                out.write(json.dumps(order, separators=(",", ":")) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, journal.path)
+        os.replace(journal.legacy_path, journal.legacy_path + ".migrated")
+    return count
+
+
+_journal: Optional[OrderJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_order_journal() -> OrderJournal:
+    """Process-wide journal shared by every session."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = OrderJournal()
+            # The write queue may drain into it after this runs; see shutdown()
+            atexit.register(_journal.shutdown)
+        return _journal
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ["migrate"]:
+        print("usage: python order_journal.py migrate")
+        return 2
+    moved = migrate_legacy_orders(get_order_journal())
+    print(f"Migrated {moved} order(s) from {ORDERS_FILE} into {ORDERS_JOURNAL_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import threading
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime
+from numbers import Number
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from catalog import Catalog, get_catalog
+from utils import WRITE_QUEUE_RESULT_TIMEOUT
+from write_queue import WriteBehindQueue, get_write_queue
+
+# Checkout keys remembered per process; a duplicate older than this many
+# orders would be written again.
+IDEMPOTENCY_KEYS_KEPT = 10_000
+
+
+def new_checkout_key() -> str:
+    """Idempotency key for one checkout attempt."""
+    return uuid.uuid4().hex
+
+
+def reprice(items: List[Dict[str, Any]], catalog: Catalog) -> List[Dict[str, Any]]:
+    """Copies of the cart lines with name and price from the current catalog.
+
+    The session cart keeps the price seen when the item was added, which may
+    be out of date by checkout. Raises ValueError for a medicine that is no
+    longer listed.
+    """
+    lines = []
+    for item in items:
+        medicine = catalog.get_by_id(item.get("id"))
+        if medicine is None:
+            raise ValueError(f"{item.get('name', 'An item')} is no longer available; please remove it from your cart.")
+        line = dict(item)
+        line["name"] = medicine.get("name", line.get("name"))
+        line["price"] = medicine.get("price")
+        lines.append(line)
+    return lines
+
+
+def order_total(items: List[Dict[str, Any]]):
+    """Recompute the order total from its lines, rejecting malformed ones."""
+    total = Decimal(0)
+    for item in items:
+        qty, price = item.get("qty"), item.get("price")
+        if not isinstance(qty, int) or isinstance(qty, bool) or qty < 1:
+            raise ValueError(f"Invalid quantity for {item.get('name', 'item')}")
+        if not isinstance(price, Number) or isinstance(price, bool) or price < 0:
+            raise ValueError(f"Invalid price for {item.get('name', 'item')}")
+        total += Decimal(str(price)) * qty
+    # Summed as Decimal so 10.1 + 0.2 is stored as 10.3; whole totals stay ints
+    return int(total) if total == total.to_integral_value() else float(total)
+
+
+class OrderService:
+    """The one write path for orders.
+
+    Each checkout attempt carries an idempotency key. The first call with a
+    key builds the order, prices its lines from the current catalog,
+    recomputes the total and queues it on the write-behind queue, returning
+    once the write is acknowledged; any later call with the same key,
+    including one racing the first, returns that order without touching the
+    store.
+    """
+
+    def __init__(self, writer: Optional[WriteBehindQueue] = None, keys_kept: int = IDEMPOTENCY_KEYS_KEPT,
+                 catalog: Callable[[], Catalog] = get_catalog):
+        self._writer = writer
+        self._catalog = catalog
+        self._keys_kept = keys_kept
+        self._orders: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def writer(self) -> WriteBehindQueue:
+        return self._writer or get_write_queue()
+
+    def place_order(self, checkout_key: str, username: str, items: List[Dict[str, Any]],
+                    address: str, now: Optional[datetime] = None) -> Tuple[Dict[str, Any], bool]:
+        """Place an order once per checkout key.
+
+        Returns (order, created); created is False for a duplicate submission.
+        Raises ValueError for an empty cart, a blank address, a bad line or
+        a medicine no longer in the catalog,
+        and concurrent.futures.TimeoutError if the write is still pending
+        after WRITE_QUEUE_RESULT_TIMEOUT (it may yet succeed; the checkout
+        key stays claimed unless it fails).
+        """
+        with self._lock:
+            existing = self._orders.get(checkout_key)
+        if existing is not None:
+            return existing, False
+        if not items:
+            raise ValueError("Your cart is empty.")
+        if not address or not address.strip():
+            raise ValueError("Please enter your delivery address.")
+        # Only a new key gets here, so duplicates never touch the catalog
+        catalog = self._catalog()
+        with self._lock:
+            existing = self._orders.get(checkout_key)
+            if existing is not None:
+                return existing, False  # claimed while the catalog was loading
+            items = reprice(items, catalog)
+            order = {
+                "user": username,
+                "items": items,
+                "total": order_total(items),
+                "datetime": (now or datetime.now()).strftime("%Y-%m-%d %H:%M:%S"),
+                "address": address,
+                "order_id": checkout_key,
+            }
+            # Claimed before the write so a concurrent duplicate is a no-op too
+            self._orders[checkout_key] = order
+        def release(future=None):
+            if future is None or future.cancelled() or future.exception() is not None:
+                with self._lock:
+                    self._orders.pop(checkout_key, None)
+
+        future = self.writer.submit_order(order)
+        try:
+            future.result(timeout=WRITE_QUEUE_RESULT_TIMEOUT)
+        except FutureTimeout:
+            future.add_done_callback(release)
+            raise
+        except Exception:
+            release()
+            raise
+        with self._lock:
+            while len(self._orders) > self._keys_kept:
+                self._orders.popitem(last=False)
+        return order, True
+
+
+_order_service: Optional[OrderService] = None
+_order_service_lock = threading.Lock()
+
+
+def get_order_service() -> OrderService:
+    """Process-wide order service, so duplicate checks span sessions."""
+    global _order_service
+    with _order_service_lock:
+        if _order_service is None:
+            _order_service = OrderService()
+        return _order_service
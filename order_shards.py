@@ -0,0 +1,190 @@
+import heapq
+import os
+import shutil
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from order_archive import OrderArchive, get_order_archive
+from order_journal import META_KEY, OrderJournal, get_order_journal, parse_line
+from utils import ORDER_JOURNAL_FSYNC, ORDER_SHARD_BUCKETS, ORDER_SHARD_DIR
+
+SHARD_SUFFIX = ".jsonl"
+OPEN_SHARDS = 256        # idle journals (and file descriptors) kept open at once
+MERGE_READ_AHEAD = 64    # lines buffered per shard while merging
+
+
+def _iter_shard_lazily(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield a shard's orders, holding its file open only while refilling a small buffer.
+
+    Merging thousands of shards would otherwise need a descriptor per shard.
+    """
+    offset = 0
+    while True:
+        batch = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn tail, not yet committed
+                record = parse_line(line, path, offset)
+                offset += len(line)
+                if record is not None and META_KEY not in record:
+                    batch.append(record)
+                if len(batch) >= MERGE_READ_AHEAD:
+                    break
+        if not batch:
+            return
+        yield from batch
+
+
+class ShardedOrderStore:
+    """Orders split into one append-only journal per user, or per hash bucket of users.
+
+    Placing an order appends to, and a history page reads from, only the
+    owner's shard, so lock contention and read cost follow that user's own
+    activity. Each shard is an OrderJournal with its own per-user index.
+
+    Open journals are kept in an LRU. Callers borrow a journal for the length
+    of one operation; one evicted while borrowed is closed by its last
+    borrower instead of out from under it.
+    """
+
+    def __init__(self, root: str = ORDER_SHARD_DIR, buckets: int = ORDER_SHARD_BUCKETS,
+                 fsync: str = ORDER_JOURNAL_FSYNC):
+        self.root = root
+        self.buckets = buckets
+        self.fsync = fsync
+        # path -> [journal, borrowers]
+        self._journals: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def shard_name(self, username: str) -> str:
+        if self.buckets:
+            return f"bucket-{zlib.crc32(username.encode('utf-8')) % self.buckets:05d}"
+        return "user-" + quote(username, safe="")
+
+    def shard_path(self, username: str) -> str:
+        return os.path.join(self.root, self.shard_name(username) + SHARD_SUFFIX)
+
+    @contextmanager
+    def _borrow(self, path: str) -> Iterator[OrderJournal]:
+        with self._lock:
+            entry = self._journals.get(path)
+            if entry is None:
+                os.makedirs(self.root, exist_ok=True)
+                entry = self._journals[path] = [OrderJournal(path, legacy_path=None, fsync=self.fsync), 0]
+                if len(self._journals) > OPEN_SHARDS:
+                    _, evicted = self._journals.popitem(last=False)
+                    if not evicted[1]:
+                        evicted[0].close()
+            else:
+                self._journals.move_to_end(path)
+            entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1] and self._journals.get(path) is not entry:
+                    entry[0].close()  # evicted while we were using it
+
+    def append_many(self, orders: List[Dict[str, Any]]):
+        """One write per shard touched by the batch."""
+        by_shard: Dict[str, List[Dict[str, Any]]] = {}
+        for order in orders:
+            by_shard.setdefault(self.shard_path(order.get("user", "")), []).append(order)
+        for path, shard_orders in by_shard.items():
+            with self._borrow(path) as journal:
+                journal.append_many(shard_orders)
+
+    def user_orders_page(self, username: str, start: int = 0,
+                         limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """(orders, total) for one user, newest first, from that user's shard only."""
+        with self._borrow(self.shard_path(username)) as journal:
+            return journal.index.user_orders_page(username, start, limit)
+
+    def shard_paths(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(os.path.join(self.root, name) for name in os.listdir(self.root)
+                      if name.endswith(SHARD_SUFFIX))
+
+    def iter_orders(self) -> Iterator[Dict[str, Any]]:
+        """Every order across all shards, merged lazily by datetime."""
+        shards = [_iter_shard_lazily(path) for path in self.shard_paths()]
+        return heapq.merge(*shards, key=lambda order: order.get("datetime") or "")
+
+    def close(self):
+        """Close idle journals; borrowed ones are closed when returned."""
+        with self._lock:
+            for journal, borrowers in self._journals.values():
+                if not borrowers:
+                    journal.close()
+            self._journals.clear()
+
+
+def split_journal(source: OrderJournal, store: ShardedOrderStore, archive: Optional[OrderArchive] = None,
+                  batch_size: int = 10_000) -> int:
+    """Copy every order, archived ones included, into `store` oldest first; returns the count."""
+    archive = archive or get_order_archive()
+    count = 0
+    batch = []
+    for order in chain(archive.iter_orders(source.archive_generation()), source.iter_orders()):
+        batch.append(order)
+        if len(batch) >= batch_size:
+            store.append_many(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        store.append_many(batch)
+        count += len(batch)
+    return count
+
+
+def build_shards(source: OrderJournal, root: str = ORDER_SHARD_DIR, buckets: int = ORDER_SHARD_BUCKETS,
+                 fsync: str = ORDER_JOURNAL_FSYNC, archive: Optional[OrderArchive] = None) -> int:
+    """Split the single journal and its archive into a new shard directory at `root`; returns the order count.
+
+    Shards are written under a temporary directory that is renamed to `root`
+    only once complete, so an interrupted split leaves nothing behind and
+    can simply be run again. Raises FileExistsError if `root` already holds
+    shards. Run it while no checkout is in progress, before switching the
+    backend to "sharded".
+    """
+    if ShardedOrderStore(root).shard_paths():
+        raise FileExistsError(f"{root} already holds order shards; not splitting again")
+    tmp_root = root.rstrip("/\\") + ".split-tmp"
+    shutil.rmtree(tmp_root, ignore_errors=True)  # left by an interrupted split
+    store = ShardedOrderStore(tmp_root, buckets, fsync)
+    try:
+        count = split_journal(source, store, archive)
+    finally:
+        store.close()
+    if os.path.isdir(root):
+        shutil.rmtree(root)  # no shards in it, at most stale lock files
+    os.rename(tmp_root, root)
+    return count
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ["split"]:
+        print("usage: python order_shards.py split")
+        return 2
+    try:
+        moved = build_shards(get_order_journal())
+    except FileExistsError as e:
+        print(e)
+        return 1
+    print(f"Split {moved} order(s) into {len(ShardedOrderStore().shard_paths())} shard(s) under {ORDER_SHARD_DIR}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
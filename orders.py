@@ -1,7 +1,35 @@
 import streamlit as st
-from datetime import datetime
-from utils import load_json, save_json, ORDERS_FILE
-from cart import show_cart
+from concurrent.futures import TimeoutError as FutureTimeout
+from storage import get_storage
+from cart import show_cart, get_cart
+from order_service import get_order_service, new_checkout_key
+
+ORDERS_PER_PAGE = 10
+
+def _checkout_key():
+    # One key per checkout attempt; replaced only after an order goes through
+    if "checkout_key" not in st.session_state:
+        st.session_state["checkout_key"] = new_checkout_key()
+    return st.session_state["checkout_key"]
+
+def submit_order(username, address):
+    """Place the session cart as an order; resubmitting the same checkout is a no-op."""
+    cart = get_cart()
+    try:
+        get_order_service().place_order(_checkout_key(), username, cart.to_list(), address)
+    except ValueError as e:
+        st.warning(str(e))
+        return False
+    except FutureTimeout:
+        # The checkout key is kept, so submitting again cannot place it twice
+        st.error("Saving your order is taking longer than usual. Please check your orders before trying again.")
+        return False
+    st.session_state.pop("checkout_key", None)
+    st.session_state["address"] = address
+    st.success("Order placed successfully!")
+    cart.clear()
+    st.session_state["cart_quantities"] = {}
+    return True
 
 def place_order(username):
     # Show cart and ask for address, then place order
@@ -9,45 +37,44 @@ def place_order(username):
         return
     address = st.text_input("Delivery Address", value=st.session_state.get("address", ""), key="order_address")
     if st.button("Place Order", key="place_order_btn"):
-        if not address.strip():
-            st.warning("Please enter your delivery address.")
+        if not submit_order(username, address):
             return
-        orders = load_json(ORDERS_FILE)
-        order = {
-            "user": username,
-            "items": st.session_state["cart"],
-            "total": sum(item["price"] * item["qty"] for item in st.session_state["cart"]),
-            "datetime": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "address": address
-        }
-        orders.append(order)
-        save_json(ORDERS_FILE, orders)
-        st.session_state["address"] = address
-        st.success("Order placed successfully!")
-        st.session_state["cart"] = []
-        st.session_state["cart_quantities"] = {}
         # Redirect to order history page
         st.session_state["dashboard_menu_selected"] = 2  # Order History index
         st.rerun()
 
 def view_orders(username):
-    orders = load_json(ORDERS_FILE)
-    user_orders = [o for o in orders if o["user"] == username]
     st.header("Your Orders")
-    if not user_orders:
+    storage = get_storage()
+    # Only the selected page is read from the store, newest orders first
+    page = st.session_state.get("orders_page", 1)
+    start = (page - 1) * ORDERS_PER_PAGE
+    page_orders, total = storage.user_orders_page(username, start, ORDERS_PER_PAGE)
+    if not total:
         st.info("No orders yet.")
         return
-    for idx, order in enumerate(user_orders, 1):
-        st.write(f"Order {idx}:")
-        st.write(f"Date: {order.get('datetime', 'N/A')}")
-        st.write(f"Address: {order.get('address', 'N/A')}")
-        for item in order["items"]:
-            st.write(f"- {item['name']} x {item['qty']} = ₹{item['price']*item['qty']}")
-        st.write(f"Total: ₹{order['total']}")
+    total_pages = (total + ORDERS_PER_PAGE - 1) // ORDERS_PER_PAGE
+    if page > total_pages:
+        page = st.session_state["orders_page"] = total_pages
+        start = (page - 1) * ORDERS_PER_PAGE
+        page_orders, total = storage.user_orders_page(username, start, ORDERS_PER_PAGE)
+    st.write(f"{total} order(s)")
+    if total_pages > 1:
+        st.selectbox(f"📄 Page (of {total_pages})", range(1, total_pages + 1), key="orders_page")
+    for idx, order in enumerate(page_orders):
+        header = "  \n".join([
+            f"**Order {total - start - idx}:**",
+            f"Date: {order.get('datetime', 'N/A')}",
+            f"Address: {order.get('address', 'N/A')}",
+        ])
+        items = "\n".join(f"- {item['name']} x {item['qty']} = ₹{item['price']*item['qty']}"
+                          for item in order["items"])
+        # One element per order rather than one per line
+        st.markdown(f"{header}\n\n{items}\n\nTotal: ₹{order['total']}")
         st.markdown("---")
 
 def order_page(username):
-    cart = st.session_state.get("cart", [])
+    cart = get_cart()
     if not cart:
         st.warning("Your cart is empty. Please add items before placing an order.")
         if st.button("Browse Medicines", key="order_browse_meds"):
@@ -58,32 +85,15 @@ def order_page(username):
 
     st.header("Confirm Your Order")
     st.subheader("Order Summary")
-    total_amount = 0
     for item in cart:
         st.write(f"- {item['name']} x {item['qty']} = ₹{item['price']*item['qty']}")
-        total_amount += item['price'] * item['qty']
-    st.write(f"**Total: ₹{total_amount}**")
+    st.write(f"**Total: ₹{cart.total_amount}**")
     st.markdown("---")
 
     address = st.text_area("Enter Delivery Address", value=st.session_state.get("address", ""), key="order_address_textarea")
     if st.button("Place Order", key="place_order_btn2", type="primary"):
-        if not address.strip():
-            st.warning("Please enter your delivery address.")
+        if not submit_order(username, address):
             return
-        orders = load_json(ORDERS_FILE)
-        order = {
-            "user": username,
-            "items": cart,
-            "total": total_amount,
-            "datetime": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "address": address
-        }
-        orders.append(order)
-        save_json(ORDERS_FILE, orders)
-        st.session_state["address"] = address
-        st.success("Order placed successfully!")
-        st.session_state["cart"] = []
-        st.session_state["cart_quantities"] = {}
         st.session_state["dashboard_menu_selected"] = 2  # Order History
         st.session_state["current_page"] = "dashboard"
         st.rerun()
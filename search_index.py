@@ -0,0 +1,210 @@
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+SEARCH_FIELDS = ("name", "description", "manufacturer", "category")
+
+_TOKEN_RE = re.compile(r"\w+")
+_QUERY_CACHE_SIZE = 256
+# Below this many candidates, verifying directly beats intersecting more postings
+_VERIFY_THRESHOLD = 2000
+
+
+def search_text(medicine: Dict[str, Any]) -> Tuple[str, ...]:
+    """Lowercased searchable fields, in the order _matches_search checks them."""
+    return tuple(str(medicine.get(field) or "").lower() for field in SEARCH_FIELDS)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class TokenIndex:
+    """Inverted index from normalized tokens to catalog positions.
+
+    Matching keeps the old substring semantics: a query matches a medicine when
+    the lowercased query occurs inside one of its search fields. Every word of
+    the query must then sit inside one token of that medicine, so the index
+    narrows the catalog to medicines holding such tokens (one C-level scan
+    over the sorted vocabulary finds prefix and infix hits alike) and only
+    those few are checked for the full substring.
+    """
+
+    def __init__(self, medicines: Sequence[Dict[str, Any]]):
+        self.size = len(medicines)
+        self.haystacks: List[Tuple[str, ...]] = []
+        postings: Dict[str, List[int]] = {}
+        for pos, med in enumerate(medicines):
+            fields = search_text(med)
+            self.haystacks.append(fields)
+            for token in set(_TOKEN_RE.findall(" ".join(fields))):
+                postings.setdefault(token, []).append(pos)
+        self.vocabulary = sorted(postings)
+        self.postings: Dict[str, FrozenSet[int]] = {token: frozenset(ids) for token, ids in postings.items()}
+        # All tokens in one newline-separated string, so an infix lookup is a
+        # C-level str.find over the vocabulary instead of a Python loop.
+        self._blob = "\n".join(self.vocabulary)
+        self._starts: List[int] = []
+        offset = 0
+        for token in self.vocabulary:
+            self._starts.append(offset)
+            offset += len(token) + 1
+        self._query_cache: "OrderedDict[str, FrozenSet[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tokens_containing(self, fragment: str) -> List[str]:
+        found = []
+        blob, starts, vocab = self._blob, self._starts, self.vocabulary
+        last = -1
+        idx = blob.find(fragment)
+        while idx != -1:
+            token_pos = bisect_right(starts, idx) - 1
+            if token_pos != last:
+                found.append(vocab[token_pos])
+                last = token_pos
+            # jump to the next token; any further hit in this one adds nothing
+            idx = blob.find(fragment, starts[token_pos] + len(vocab[token_pos]) + 1)
+        return found
+
+    def ids_for_fragment(self, fragment: str) -> FrozenSet[int]:
+        """Positions of medicines with a token containing `fragment`."""
+        with self._lock:
+            cached = self._query_cache.get(fragment)
+            if cached is not None:
+                self._query_cache.move_to_end(fragment)
+                return cached
+        tokens = self._tokens_containing(fragment)
+        if len(tokens) == 1:
+            ids = self.postings[tokens[0]]
+        else:
+            ids = frozenset().union(*(self.postings[token] for token in tokens))
+        with self._lock:
+            self._query_cache[fragment] = ids
+            if len(self._query_cache) > _QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return ids
+
+    def search(self, query: str) -> Optional[List[int]]:
+        """Catalog positions matching `query`, in catalog order.
+
+        Returns None when the query has no word characters, in which case the
+        caller falls back to a linear substring scan.
+        """
+        needle = query.lower()
+        fragments = tokenize(needle)
+        if not fragments:
+            return None
+        if fragments == [needle]:
+            # a single bare word: any token containing it is already a match
+            return sorted(self.ids_for_fragment(needle))
+        # longest fragments are usually the rarest, so start with them
+        ordered = sorted(set(fragments), key=len, reverse=True)
+        candidates = set(self.ids_for_fragment(ordered[0]))
+        for fragment in ordered[1:]:
+            if len(candidates) <= _VERIFY_THRESHOLD:
+                break
+            candidates &= self.ids_for_fragment(fragment)
+        haystacks = self.haystacks
+        return [pos for pos in sorted(candidates)
+                if any(needle in field for field in haystacks[pos])]
+
+
+FUZZY_MIN_SIMILARITY = 0.3   # trigram (Dice) similarity a token needs to be a candidate
+FUZZY_MAX_CANDIDATES = 50    # tokens per query word that get an edit-distance re-rank
+FUZZY_MIN_SCORE = 0.6        # edit-distance similarity a token needs to count as a hit
+
+
+def trigrams(word: str) -> FrozenSet[str]:
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def edit_distance(a: str, b: str) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def _similarity(word: str, token: str) -> float:
+    """1.0 for identical words, falling with edit distance; half-typed prefixes count too."""
+    full = 1 - edit_distance(word, token) / max(len(word), len(token))
+    if len(token) > len(word):
+        prefix = 0.9 * (1 - edit_distance(word, token[:len(word)]) / len(word))
+        return max(full, prefix)
+    return full
+
+
+class TrigramIndex:
+    """Character-trigram index over a TokenIndex vocabulary for typo-tolerant search.
+
+    Candidates are vocabulary tokens sharing trigrams with a query word; only
+    the best FUZZY_MAX_CANDIDATES of them per word get an edit-distance pass,
+    so a query never touches every SKU.
+    """
+
+    def __init__(self, token_index: TokenIndex):
+        self.token_index = token_index
+        self.vocabulary = token_index.vocabulary
+        self._gram_counts: List[int] = []
+        grams: Dict[str, List[int]] = {}
+        for token_id, token in enumerate(self.vocabulary):
+            token_grams = trigrams(token)
+            self._gram_counts.append(len(token_grams))
+            for gram in token_grams:
+                grams.setdefault(gram, []).append(token_id)
+        self.grams = grams
+
+    def similar_tokens(self, word: str) -> List[Tuple[str, float]]:
+        """(token, similarity) pairs for `word`, best first."""
+        word_grams = trigrams(word)
+        shared: Dict[int, int] = {}
+        for gram in word_grams:
+            for token_id in self.grams.get(gram, ()):
+                shared[token_id] = shared.get(token_id, 0) + 1
+        gram_counts = self._gram_counts
+        scored = []
+        for token_id, count in shared.items():
+            dice = 2 * count / (len(word_grams) + gram_counts[token_id])
+            if dice >= FUZZY_MIN_SIMILARITY:
+                scored.append((dice, token_id))
+        scored.sort(reverse=True)
+        ranked = []
+        for _, token_id in scored[:FUZZY_MAX_CANDIDATES]:
+            token = self.vocabulary[token_id]
+            similarity = _similarity(word, token)
+            if similarity >= FUZZY_MIN_SCORE:
+                ranked.append((token, similarity))
+        ranked.sort(key=lambda pair: pair[1], reverse=True)
+        return ranked
+
+    def search(self, query: str) -> List[Tuple[int, float]]:
+        """(catalog position, score) pairs ordered by score, best first.
+
+        A medicine's score is the mean over query words of its best-matching
+        token, so every word counts towards the ranking.
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return []
+        postings = self.token_index.postings
+        totals: Dict[int, float] = {}
+        for word in words:
+            best: Dict[int, float] = {}
+            for token, similarity in self.similar_tokens(word):
+                for pos in postings[token]:
+                    if similarity > best.get(pos, 0.0):
+                        best[pos] = similarity
+            for pos, similarity in best.items():
+                totals[pos] = totals.get(pos, 0.0) + similarity
+        results = [(pos, total / len(words)) for pos, total in totals.items()]
+        results = [item for item in results if item[1] >= FUZZY_MIN_SCORE]
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results
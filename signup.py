@@ -1,5 +1,7 @@
 import streamlit as st
-from utils import is_valid_email, is_valid_password, save_user_data, rerun
+from utils import is_valid_email, is_valid_password, rerun
+from storage import get_storage
+from credentials import get_credential_pool, CredentialsBusy
 
 
 def signup_page():
@@ -38,10 +40,13 @@ def signup_page():
             password = st.text_input("Password", type="password", help="At least 6 chars, uppercase, digit & special char")
 
             error_msgs = []
-            if username and username in st.session_state.get("user_data", {}):
+            storage = get_storage()
+            if username and storage.get_user(username) is not None:
                 error_msgs.append("⚠️ Username already exists.")
             if email and not is_valid_email(email):
                 error_msgs.append("❌ Invalid email format.")
+            elif email and storage.get_username_by_email(email) is not None:
+                error_msgs.append("⚠️ An account with this email already exists.")
             if password:
                 valid_pwd, pwd_msg = is_valid_password(password)
                 if not valid_pwd:
@@ -64,14 +69,19 @@ def signup_page():
                 elif error_msgs:
                     st.warning("⚠️ Please fix the errors above before submitting.")
                 else:
-                    if "user_data" not in st.session_state:
-                        st.session_state["user_data"] = {}
-                    st.session_state["user_data"][username] = {
+                    try:
+                        password_fields = get_credential_pool().hash(password)
+                    except CredentialsBusy:
+                        st.error("⏳ Too many sign-ups right now. Please try again in a moment.")
+                        return
+                    user_record = {
                         "email": email,
-                        "password": password,
+                        **password_fields,
                         "role": "user"  # Assign user role on signup
                     }
-                    save_user_data(st.session_state["user_data"])
-                    st.success("🎉 Signup successful! Please login.")
-                    st.session_state["current_page"] = "login"
-                    rerun(st)
+                    if not storage.add_user(username, user_record):
+                        st.warning("⚠️ Username already exists.")
+                    else:
+                        st.success("🎉 Signup successful! Please login.")
+                        st.session_state["current_page"] = "login"
+                        rerun(st)
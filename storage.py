@@ -0,0 +1,546 @@
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from order_archive import OrderArchive, get_order_archive
+from order_journal import OrderJournal, get_order_journal
+from order_shards import ShardedOrderStore
+from user_directory import UserDirectory, get_user_directory
+from utils import (
+    iter_json,
+    load_json,
+    update_json,
+    CONSULTS_FILE,
+    MEDICINES_FILE,
+    SQLITE_DB_FILE,
+    STORAGE_BACKEND,
+)
+
+
+class Storage(ABC):
+    """Record-level persistence API used by the pages.
+
+    Implementations: JsonStorage (the flat files in utils) and SqliteStorage.
+    """
+
+    # Users
+    @abstractmethod
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_users(self) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_username_by_email(self, email: str) -> Optional[str]:
+        """Username registered with `email`, compared case-insensitively."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_user(self, username: str, record: Dict[str, Any]) -> bool:
+        """Insert a new user; returns False if the username is taken."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_user(self, username: str, record: Dict[str, Any]):
+        raise NotImplementedError
+
+    def add_users(self, records: Dict[str, Dict[str, Any]]) -> int:
+        """Insert many users, skipping taken usernames; returns how many were added."""
+        return sum(1 for username, record in records.items() if self.add_user(username, record))
+
+    # Catalog
+    @abstractmethod
+    def load_medicines(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def catalog_signature(self) -> Any:
+        """Cheap token that changes whenever the catalog does."""
+        raise NotImplementedError
+
+    # Orders
+    def append_order(self, order: Dict[str, Any]):
+        self.append_orders([order])
+
+    @abstractmethod
+    def append_orders(self, orders: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_orders(self) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def user_orders(self, username: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def user_orders_page(self, username: str, start: int = 0,
+                         limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """(orders, total) for one user, newest first."""
+        orders = self.user_orders(username)[::-1]
+        stop = len(orders) if limit is None else start + limit
+        return orders[start:stop], len(orders)
+
+    # Consultations
+    def append_consultation(self, consultation: Dict[str, Any]):
+        self.append_consultations([consultation])
+
+    @abstractmethod
+    def append_consultations(self, consultations: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_consultations(self) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def user_consultations(self, username: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class JsonStorage(Storage):
+    """The original flat-file layout, with orders in the append-only journal.
+
+    Orders compacted out of the journal are read back from the order archive.
+    """
+
+    def __init__(self, journal: Optional[OrderJournal] = None, archive: Optional[OrderArchive] = None,
+                 users: Optional[UserDirectory] = None):
+        self.journal = journal or get_order_journal()
+        self.archive = archive or get_order_archive()
+        self.users = users if users is not None else get_user_directory()
+
+    def get_user(self, username):
+        return self.users.get(username)
+
+    def load_users(self):
+        return self.users.all()
+
+    def get_username_by_email(self, email):
+        return self.users.get_by_email(email)
+
+    def add_user(self, username, record):
+        return self.users.add(username, record)
+
+    def update_user(self, username, record):
+        self.users.update(username, record)
+
+    def add_users(self, records):
+        return self.users.add_many(records)
+
+    def load_medicines(self):
+        return load_json(MEDICINES_FILE)
+
+    def catalog_signature(self):
+        try:
+            stat = os.stat(MEDICINES_FILE)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def append_orders(self, orders):
+        self.journal.append_many(orders)
+
+    def iter_orders(self):
+        generation = self.journal.archive_generation()
+        return chain(self.archive.iter_orders(generation), self.journal.iter_orders())
+
+    def user_orders(self, username):
+        orders, _ = self.user_orders_page(username)
+        orders.reverse()
+        return orders
+
+    def user_orders_page(self, username, start=0, limit=None):
+        orders, hot_total = self.journal.index.user_orders_page(username, start, limit)
+        generation = self.journal.archive_generation()
+        if not generation:
+            return orders, hot_total
+        # Older pages continue into the archive, newest segment first
+        total = hot_total + self.archive.user_count(username, generation)
+        if limit is None or len(orders) < limit:
+            remaining = None if limit is None else limit - len(orders)
+            orders += self.archive.user_orders_page(username, max(0, start - hot_total), remaining, generation)
+        return orders, total
+
+    def append_consultations(self, consultations):
+        update_json(CONSULTS_FILE, lambda existing: existing.extend(consultations))
+
+    def iter_consultations(self):
+        return iter_json(CONSULTS_FILE)
+
+    def user_consultations(self, username):
+        return [c for c in iter_json(CONSULTS_FILE) if c.get("user") == username]
+
+
+class ShardedJsonStorage(JsonStorage):
+    """JsonStorage with orders kept in per-user shards (see order_shards).
+
+    The split copies archived orders into the shards too, so history and the
+    admin iterator read the shards alone.
+    """
+
+    def __init__(self, shards: Optional[ShardedOrderStore] = None):
+        super().__init__()
+        self.shards = shards or ShardedOrderStore()
+
+    def append_orders(self, orders):
+        self.shards.append_many(orders)
+
+    def iter_orders(self):
+        return self.shards.iter_orders()
+
+    def user_orders(self, username):
+        orders, _ = self.shards.user_orders_page(username)
+        orders.reverse()
+        return orders
+
+    def user_orders_page(self, username, start=0, limit=None):
+        return self.shards.user_orders_page(username, start, limit)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email TEXT,
+    role TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE INDEX IF NOT EXISTS idx_users_email_nocase ON users(lower(trim(email)));
+
+CREATE TABLE IF NOT EXISTS medicines (
+    id PRIMARY KEY,
+    name TEXT,
+    category TEXT,
+    price NUMERIC,
+    stock INTEGER,
+    expiry_date TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_medicines_category ON medicines(category);
+
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    seeded INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO catalog_meta (id, version) VALUES (1, 0);
+
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL,
+    total NUMERIC,
+    datetime TEXT,
+    address TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_orders_user_datetime ON orders(user, datetime);
+CREATE INDEX IF NOT EXISTS idx_orders_datetime ON orders(datetime);
+
+CREATE TABLE IF NOT EXISTS order_items (
+    order_id INTEGER NOT NULL REFERENCES orders(id),
+    position INTEGER NOT NULL,
+    medicine_id,
+    name TEXT,
+    price NUMERIC,
+    qty INTEGER,
+    category TEXT,
+    expiry_date TEXT,
+    PRIMARY KEY (order_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_order_items_medicine ON order_items(medicine_id);
+
+CREATE TABLE IF NOT EXISTS consultations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL,
+    symptoms TEXT,
+    preferred_time TEXT,
+    datetime TEXT,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_consultations_user_datetime ON consultations(user, datetime);
+CREATE INDEX IF NOT EXISTS idx_consultations_datetime ON consultations(datetime);
+"""
+
+ORDER_COLUMNS = ("user", "total", "datetime", "address")
+ITEM_COLUMNS = ("id", "name", "price", "qty", "category", "expiry_date")
+CONSULT_COLUMNS = ("user", "symptoms", "preferred_time", "datetime", "status")
+
+
+class SqliteStorage(Storage):
+    """SQLite (WAL mode) store with one connection per thread."""
+
+    def __init__(self, path: str = SQLITE_DB_FILE, seed: bool = True):
+        """Open (creating if needed) the database at `path`.
+
+        With seed=True a database that has not been seeded yet is filled
+        from the JSON files. With seed=False the caller fills it (see
+        migrate.py), and it is marked seeded so the app never imports on top.
+        """
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(catalog_meta)")}
+        if "seeded" not in columns:
+            # Databases from before the flag were seeded when they were created
+            try:
+                with conn:
+                    conn.execute("ALTER TABLE catalog_meta ADD COLUMN seeded INTEGER NOT NULL DEFAULT 1")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):  # another process added it first
+                    raise
+        if seed:
+            self.seed_from(JsonStorage())
+        else:
+            with self._transaction() as conn:
+                conn.execute("UPDATE catalog_meta SET seeded = 1 WHERE id = 1")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """One transaction per outermost use; nested uses join the enclosing one."""
+        conn = self._conn()
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        try:
+            if depth:
+                yield conn
+            else:
+                with conn:
+                    yield conn
+        finally:
+            self._local.depth = depth
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # Users
+    def get_user(self, username):
+        row = self._conn().execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_users(self):
+        rows = self._conn().execute("SELECT username, data FROM users")
+        return {username: json.loads(data) for username, data in rows}
+
+    def get_username_by_email(self, email):
+        if not isinstance(email, str) or not email.strip():
+            return None
+        row = self._conn().execute(
+            "SELECT username FROM users WHERE lower(trim(email)) = ? ORDER BY rowid LIMIT 1",
+            (email.strip().lower(),),
+        ).fetchone()
+        return row[0] if row else None
+
+    def add_user(self, username, record):
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, email, role, data) VALUES (?, ?, ?, ?)",
+                    (username, record.get("email"), record.get("role", "user"), json.dumps(record)),
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def update_user(self, username, record):
+        values = (record.get("email"), record.get("role", "user"), json.dumps(record), username)
+        with self._transaction() as conn:
+            # UPDATE keeps the rowid, so the account keeps its place for get_username_by_email
+            if not conn.execute("UPDATE users SET email = ?, role = ?, data = ? WHERE username = ?", values).rowcount:
+                conn.execute("INSERT INTO users (email, role, data, username) VALUES (?, ?, ?, ?)", values)
+
+    def add_users(self, records):
+        conn = self._conn()
+        before = conn.total_changes
+        with self._transaction():
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (username, email, role, data) VALUES (?, ?, ?, ?)",
+                ((username, record.get("email"), record.get("role", "user"), json.dumps(record))
+                 for username, record in records.items()),
+            )
+        return conn.total_changes - before
+
+    # Catalog
+    def load_medicines(self):
+        rows = self._conn().execute("SELECT data FROM medicines ORDER BY rowid")
+        return [json.loads(data) for (data,) in rows]
+
+    def save_medicines(self, medicines: Iterable[Dict[str, Any]]):
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO medicines (id, name, category, price, stock, expiry_date, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((med.get("id"), med.get("name"), med.get("category"), med.get("price"),
+                  med.get("stock"), med.get("expiry_date"), json.dumps(med)) for med in medicines),
+            )
+            conn.execute("UPDATE catalog_meta SET version = version + 1 WHERE id = 1")
+
+    def catalog_signature(self):
+        return self._conn().execute("SELECT version FROM catalog_meta WHERE id = 1").fetchone()[0]
+
+    # Orders
+    def append_orders(self, orders):
+        with self._transaction() as conn:
+            for order in orders:
+                extra = {k: v for k, v in order.items() if k not in ORDER_COLUMNS and k != "items"}
+                cur = conn.execute(
+                    "INSERT INTO orders (user, total, datetime, address, extra) VALUES (?, ?, ?, ?, ?)",
+                    tuple(order.get(col) for col in ORDER_COLUMNS) + (json.dumps(extra) if extra else None,),
+                )
+                conn.executemany(
+                    "INSERT INTO order_items (order_id, position, medicine_id, name, price, qty, category, expiry_date) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((cur.lastrowid, pos) + tuple(item.get(col) for col in ITEM_COLUMNS)
+                     for pos, item in enumerate(order.get("items", []))),
+                )
+
+    def _build_orders(self, rows) -> List[Dict[str, Any]]:
+        rows = list(rows)
+        if not rows:
+            return []
+        ids = [row[0] for row in rows]
+        items: Dict[int, List[Dict[str, Any]]] = {order_id: [] for order_id in ids}
+        placeholders = ",".join("?" * len(ids))
+        for row in self._conn().execute(
+            f"SELECT order_id, medicine_id, name, price, qty, category, expiry_date FROM order_items "
+            f"WHERE order_id IN ({placeholders}) ORDER BY order_id, position",
+            ids,
+        ):
+            item = {col: value for col, value in zip(ITEM_COLUMNS, row[1:]) if value is not None}
+            items[row[0]].append(item)
+        orders = []
+        for order_id, user, total, dt, address, extra in rows:
+            order = {"user": user, "items": items[order_id], "total": total, "datetime": dt, "address": address}
+            if extra:
+                order.update(json.loads(extra))
+            orders.append(order)
+        return orders
+
+    def iter_orders(self):
+        cur = self._conn().execute("SELECT id, user, total, datetime, address, extra FROM orders ORDER BY id")
+        while True:
+            batch = cur.fetchmany(500)
+            if not batch:
+                return
+            yield from self._build_orders(batch)
+
+    def user_orders(self, username):
+        rows = self._conn().execute(
+            "SELECT id, user, total, datetime, address, extra FROM orders WHERE user = ? ORDER BY datetime, id",
+            (username,),
+        )
+        return self._build_orders(rows)
+
+    def user_orders_page(self, username, start=0, limit=None):
+        conn = self._conn()
+        total = conn.execute("SELECT COUNT(*) FROM orders WHERE user = ?", (username,)).fetchone()[0]
+        rows = conn.execute(
+            "SELECT id, user, total, datetime, address, extra FROM orders WHERE user = ? "
+            "ORDER BY datetime DESC, id DESC LIMIT ? OFFSET ?",
+            (username, -1 if limit is None else limit, start),
+        )
+        return self._build_orders(rows), total
+
+    # Consultations
+    def append_consultations(self, consultations):
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO consultations (user, symptoms, preferred_time, datetime, status) VALUES (?, ?, ?, ?, ?)",
+                (tuple(c.get(col) for col in CONSULT_COLUMNS) for c in consultations),
+            )
+
+    def iter_consultations(self):
+        rows = self._conn().execute(
+            "SELECT user, symptoms, preferred_time, datetime, status FROM consultations ORDER BY id"
+        )
+        for row in rows:
+            yield dict(zip(CONSULT_COLUMNS, row))
+
+    def user_consultations(self, username):
+        rows = self._conn().execute(
+            "SELECT user, symptoms, preferred_time, datetime, status FROM consultations "
+            "WHERE user = ? ORDER BY datetime, id",
+            (username,),
+        )
+        return [dict(zip(CONSULT_COLUMNS, row)) for row in rows]
+
+    def row_marks(self) -> Dict[str, int]:
+        """Highest row id of each append-only table, to undo a partial bulk load with truncate_to()."""
+        conn = self._conn()
+        return {table: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+                for table in ("orders", "consultations")}
+
+    def truncate_to(self, marks: Dict[str, int]):
+        """Delete orders and consultations added after row_marks() returned `marks`."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM order_items WHERE order_id > ?", (marks["orders"],))
+            conn.execute("DELETE FROM orders WHERE id > ?", (marks["orders"],))
+            conn.execute("DELETE FROM consultations WHERE id > ?", (marks["consultations"],))
+
+    def import_from(self, source: Storage):
+        """Copy every record from another store in one transaction."""
+        with self._transaction():
+            self.add_users(source.load_users())
+            self.save_medicines(source.load_medicines())
+            self.append_orders(list(source.iter_orders()))
+            self.append_consultations(list(source.iter_consultations()))
+
+    def seed_from(self, source: Storage) -> bool:
+        """Import `source` unless the database is already seeded; returns True if it imported.
+
+        The check, the import and the seeded flag share one IMMEDIATE
+        transaction, so a crash leaves nothing half-seeded and a second
+        process starting at the same time waits, then sees the flag.
+        """
+        with self._transaction() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT seeded FROM catalog_meta WHERE id = 1").fetchone()[0]:
+                return False
+            self.import_from(source)
+            conn.execute("UPDATE catalog_meta SET seeded = 1 WHERE id = 1")
+        return True
+
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> Storage:
+    if backend == "json":
+        return JsonStorage()
+    if backend == "sharded":
+        return ShardedJsonStorage()
+    if backend == "sqlite":
+        return SqliteStorage()
+    raise ValueError(f"Unknown storage backend {backend!r}, expected 'json', 'sharded' or 'sqlite'")
+
+
+def get_storage() -> Storage:
+    """Process-wide store selected by MEDICARE_STORAGE."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = create_storage()
+        return _storage
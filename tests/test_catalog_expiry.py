@@ -0,0 +1,45 @@
+import json
+import os
+from datetime import date
+
+import pytest
+
+from catalog import Catalog
+from conftest import REPO_ROOT
+from expiry import classify_items, EXPIRED, EXPIRING, FRESH, NO_DATE, UNKNOWN
+
+TODAY = date(2025, 6, 1)
+MEDICINES = [
+    {"id": 1, "name": "Old", "category": "Tablet", "price": 1, "stock": 5, "expiry_date": "2025-01-01"},
+    {"id": 2, "name": "Soon", "category": "Tablet", "price": 1, "stock": 5, "expiry_date": "2025-06-15"},
+    {"id": 3, "name": "New", "category": "Syrup", "price": 1, "stock": 5, "expiry_date": "2027-01-01"},
+    {"id": 4, "name": "Bad", "category": "Syrup", "price": 1, "stock": 5, "expiry_date": "01/01/2027"},
+    {"id": 5, "name": "Also old", "category": "Syrup", "price": 1, "stock": 5, "expiry_date": "2025-01-01"},
+]
+
+
+def test_catalog_statuses_for_a_known_date():
+    statuses, days = Catalog(MEDICINES, 1).expiry_status(TODAY)
+    assert list(statuses) == [EXPIRED, EXPIRING, FRESH, UNKNOWN, EXPIRED]
+    assert days[1] == 14
+
+
+def test_catalog_matches_classify_items_on_shipped_medicines():
+    with open(os.path.join(REPO_ROOT, "medicines.json")) as f:
+        medicines = json.load(f)
+    catalog = Catalog(medicines, 1)
+    assert NO_DATE not in list(catalog.expiry_ordinals)
+    for today in (TODAY, date(2026, 1, 1)):
+        assert list(catalog.expiry_status(today)[0]) == classify_items(medicines, today)
+
+
+def test_catalog_matches_cart_labels():
+    cart = pytest.importorskip("cart")
+    statuses, _ = Catalog(MEDICINES, 1).expiry_status(TODAY)
+    labels = cart.cart_expiry_statuses(MEDICINES, TODAY)
+    expected = {EXPIRED: "⚠️ EXPIRED", FRESH: "✅ Fresh", UNKNOWN: "📅 Date format invalid"}
+    for status, label in zip(statuses, labels):
+        if status == EXPIRING:
+            assert label.startswith("⏰ Expires in")
+        else:
+            assert label == expected[status]
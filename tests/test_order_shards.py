@@ -0,0 +1,21 @@
+from order_archive import OrderArchive, compact_orders
+from order_journal import OrderJournal
+from order_shards import ShardedOrderStore, build_shards
+
+
+def test_split_keeps_archived_orders(tmp_path):
+    journal = OrderJournal(str(tmp_path / "orders.jsonl"), legacy_path=None, fsync="never")
+    journal.append_many([{"user": "a", "datetime": f"2020-0{n}-01 00:00:00", "items": [], "n": n}
+                         for n in range(1, 6)])
+    journal.append({"user": "a", "datetime": "2099-01-01 00:00:00", "items": [], "n": 9})
+    archive = OrderArchive(str(tmp_path / "archive"))
+    assert compact_orders(journal, archive, max_age_days=30)["archived"] == 5
+
+    root = str(tmp_path / "shards")
+    assert build_shards(journal, root, buckets=4, fsync="never", archive=archive) == 6
+    store = ShardedOrderStore(root, 4, "never")
+    orders, total = store.user_orders_page("a", 0, 3)
+    assert [o["n"] for o in orders] == [9, 5, 4]
+    assert total == 6
+    assert [o["n"] for o in store.iter_orders()] == [1, 2, 3, 4, 5, 9]
+    store.close()
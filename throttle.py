@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+from utils import (
+    LOGIN_SESSION_BURST,
+    LOGIN_SESSION_PER_MINUTE,
+    LOGIN_THROTTLE_MAX_KEYS,
+    LOGIN_USER_BURST,
+    LOGIN_USER_PER_MINUTE,
+)
+
+
+class TokenBucketLimiter:
+    """In-process token buckets, one per key.
+
+    Buckets sit in an OrderedDict ordered by last use. A bucket left idle
+    long enough to refill completely is the same as a new one, so it is
+    dropped from the cold end on the next check; if the table still grows
+    past `max_keys`, the least recently used buckets go first. Every check
+    and eviction is O(1) (amortised).
+    """
+
+    def __init__(self, burst: int, per_minute: float, max_keys: int = LOGIN_THROTTLE_MAX_KEYS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.burst = float(burst)
+        self.per_minute = float(per_minute)
+        self.max_keys = max_keys
+        self.idle_seconds = 60.0 * self.burst / self.per_minute if self.per_minute > 0 else float("inf")
+        self.clock = clock
+        self._buckets: "OrderedDict[Hashable, List[float]]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            key, (_, stamp) = next(iter(buckets.items()))
+            if now - stamp < self.idle_seconds and len(buckets) <= self.max_keys:
+                break
+            del buckets[key]
+            self.evicted += 1
+
+    def _tokens(self, key: Hashable, now: float) -> List[float]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.per_minute / 60.0)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def stats(self) -> Dict[str, int]:
+        return {"allowed": self.allowed, "rejected": self.rejected,
+                "evicted": self.evicted, "buckets": len(self._buckets)}
+
+
+class LoginThrottle:
+    """Caps login attempts per username and per browser session.
+
+    An attempt spends one token from each of its two buckets, or none if
+    either is empty, so a blocked session cannot drain a user's bucket and
+    vice versa. Meant to run before any user lookup or password hashing.
+    """
+
+    def __init__(self, users: Optional[TokenBucketLimiter] = None,
+                 sessions: Optional[TokenBucketLimiter] = None):
+        if users is None:
+            users = TokenBucketLimiter(LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE)
+        if sessions is None:
+            sessions = TokenBucketLimiter(LOGIN_SESSION_BURST, LOGIN_SESSION_PER_MINUTE)
+        self.users = users
+        self.sessions = sessions
+        self._lock = threading.Lock()
+
+    def allow(self, username: str, session_id: str) -> bool:
+        with self._lock:
+            limiters = (self.users, self.sessions)
+            now = [limiter.clock() for limiter in limiters]
+            buckets = [limiter._tokens(key, t) for limiter, key, t in zip(limiters, (username, session_id), now)]
+            ok = all(bucket[0] >= 1 for bucket in buckets)
+            for limiter, bucket, t in zip(limiters, buckets, now):
+                if ok:
+                    bucket[0] -= 1
+                    limiter.allowed += 1
+                elif bucket[0] < 1:
+                    limiter.rejected += 1
+                limiter._evict(t)
+            return ok
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {"user": self.users.stats(), "session": self.sessions.stats()}
+
+    def metrics(self) -> str:
+        """Counters in the Prometheus text format."""
+        lines = []
+        stats = self.stats()
+        for name, kind in (("allowed", "counter"), ("rejected", "counter"),
+                           ("evicted", "counter"), ("buckets", "gauge")):
+            metric = f"medicare_login_throttle_{name}" + ("_total" if kind == "counter" else "")
+            lines.append(f"# TYPE {metric} {kind}")
+            for scope, values in stats.items():
+                lines.append(f'{metric}{{scope="{scope}"}} {values[name]}')
+        return "\n".join(lines) + "\n"
+
+
+_throttle: Optional[LoginThrottle] = None
+_throttle_lock = threading.Lock()
+
+
+def get_login_throttle() -> LoginThrottle:
+    """Process-wide throttle shared by every session."""
+    global _throttle
+    with _throttle_lock:
+        if _throttle is None:
+            _throttle = LoginThrottle()
+        return _throttle
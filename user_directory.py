@@ -0,0 +1,318 @@
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from utils import file_lock, iter_json_items, USERS_FILE, USERS_LOG_FILE
+
+META_KEY = "_meta"
+
+
+def _email_key(email: Any) -> Optional[str]:
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+class UserDirectory:
+    """Append-only user registry (users.jsonl) over the legacy users.json.
+
+    Every signup or account change is one line appended to the log, so it
+    costs a single O_APPEND write however many accounts exist; the latest
+    line for a username wins. Memory holds only an index: username -> byte
+    offset of that user's latest line, and email -> the usernames that have
+    used it, earliest first (an email shared by several accounts resolves
+    to the first still registered with it, as in SqliteStorage). The index
+    is built by one scan on first use and extended on every append; lines
+    appended by other processes are picked up after one stat() by scanning
+    on from the last indexed byte. Appends happen under the log's file lock
+    after catching up, so concurrent signups never overwrite each other.
+
+    Accounts still only in users.json are served from memory until it is
+    folded into the log with `python user_directory.py migrate`.
+    """
+
+    def __init__(self, path: str = USERS_LOG_FILE, legacy_path: Optional[str] = USERS_FILE):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._lock = threading.Lock()
+        self._built = False
+        self._file_id = None
+        self._end = 0
+        self._reader = None
+        self._fd: Optional[int] = None
+        self._legacy: Dict[str, Dict[str, Any]] = {}
+        self._offsets: Dict[str, int] = {}
+        # A plain username; a list only once a second account has used the email
+        self._by_email: Dict[str, Union[str, List[str]]] = {}
+
+    # -- index ---------------------------------------------------------------
+
+    def meta(self) -> Dict[str, Any]:
+        """The log's leading marker line, or {}."""
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "rb") as f:
+            first = f.readline()
+        try:
+            record = json.loads(first)
+        except ValueError:
+            return {}
+        return record if isinstance(record, dict) and META_KEY in record else {}
+
+    def legacy_migrated(self) -> bool:
+        return self.meta().get(META_KEY) == "migrated"
+
+    def _iter_legacy(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        if not self.legacy_path or not os.path.exists(self.legacy_path) or self.legacy_migrated():
+            return
+        for username, record in iter_json_items(self.legacy_path):
+            if isinstance(record, dict):
+                yield username, record
+
+    def _index_email(self, username: str, record: Dict[str, Any]):
+        key = _email_key(record.get("email"))
+        if key is None:
+            return
+        # Stale entries left by an email change are skipped by get_by_email
+        seen = self._by_email.get(key)
+        if seen is None:
+            self._by_email[key] = username
+        elif isinstance(seen, str):
+            if seen != username:
+                self._by_email[key] = [seen, username]
+        elif username not in seen:
+            seen.append(username)
+
+    def _reset(self, file_id):
+        legacy = {}
+        self._by_email = {}
+        for username, record in self._iter_legacy():
+            legacy[username] = record
+            self._index_email(username, record)
+        self._legacy = legacy
+        self._offsets = {}
+        self._end = 0
+        self._file_id = file_id
+        self._built = True
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _catch_up(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        file_id = (stat.st_dev, stat.st_ino) if stat else None
+        # A replaced or truncated log (after migration) is re-indexed from scratch
+        if not self._built or file_id != self._file_id or (stat and stat.st_size < self._end):
+            self._reset(file_id)
+        if stat is None or stat.st_size == self._end:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._end)
+            offset = self._end
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn tail from an interrupted write
+                entry = json.loads(line)
+                if META_KEY not in entry:
+                    self._offsets[entry["user"]] = offset
+                    self._index_email(entry["user"], entry["record"])
+                offset += len(line)
+        self._end = offset
+
+    def _read(self, username: str) -> Optional[Dict[str, Any]]:
+        offset = self._offsets.get(username)
+        if offset is None:
+            record = self._legacy.get(username)
+            return dict(record) if record is not None else None
+        if self._reader is None:
+            self._reader = open(self.path, "rb")
+        self._reader.seek(offset)
+        return json.loads(self._reader.readline())["record"]
+
+    # -- reads ---------------------------------------------------------------
+
+    def get(self, username: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._catch_up()
+            return self._read(username)
+
+    def get_by_email(self, email: str) -> Optional[str]:
+        """Username registered with `email` (case-insensitive), or None."""
+        key = _email_key(email)
+        if key is None:
+            return None
+        with self._lock:
+            self._catch_up()
+            seen = self._by_email.get(key)
+            for username in ([seen] if isinstance(seen, str) else seen or ()):
+                record = self._read(username)
+                if record is not None and _email_key(record.get("email")) == key:
+                    return username
+            return None
+
+    def __contains__(self, username: str) -> bool:
+        with self._lock:
+            self._catch_up()
+            return username in self._offsets or username in self._legacy
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._catch_up()
+            return len(self._offsets) + sum(1 for username in self._legacy if username not in self._offsets)
+
+    def usernames(self) -> List[str]:
+        """Every username, legacy accounts first, then in order of first signup."""
+        with self._lock:
+            self._catch_up()
+            return list(self._legacy) + [u for u in self._offsets if u not in self._legacy]
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(username, latest record) pairs in usernames() order, read one at a time."""
+        for username in self.usernames():
+            record = self.get(username)
+            if record is not None:
+                yield username, record
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self.items())
+
+    # -- writes --------------------------------------------------------------
+
+    def _open(self) -> int:
+        if self._fd is not None:
+            try:
+                current = os.path.samestat(os.fstat(self._fd), os.stat(self.path))
+            except FileNotFoundError:
+                current = False
+            if not current:
+                os.close(self._fd)
+                self._fd = None
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _write(self, entries: List[Tuple[str, Dict[str, Any]]], replace: bool) -> int:
+        with self._lock, file_lock(self.path):
+            # Under the file lock nobody else appends, so the index is complete after this
+            self._catch_up()
+            if not replace:
+                fresh = {}
+                for username, record in entries:
+                    if username not in self._offsets and username not in self._legacy:
+                        fresh.setdefault(username, record)
+                entries = list(fresh.items())
+            if not entries:
+                return 0
+            lines = [(json.dumps({"user": username, "record": record}, separators=(",", ":")) + "\n").encode("utf-8")
+                     for username, record in entries]
+            data = b"".join(lines)
+            fd = self._open()
+            stat = os.fstat(fd)
+            if stat.st_size != self._end:
+                os.ftruncate(fd, self._end)  # drop a torn line left by a crashed writer
+            written = 0
+            while written < len(data):
+                written += os.write(fd, data[written:])
+            os.fsync(fd)
+            self._file_id = (stat.st_dev, stat.st_ino)
+            for (username, record), line in zip(entries, lines):
+                self._offsets[username] = self._end
+                self._index_email(username, record)
+                self._end += len(line)
+            return len(entries)
+
+    def add(self, username: str, record: Dict[str, Any]) -> bool:
+        """Create an account; returns False if the username is taken."""
+        return self._write([(username, dict(record))], replace=False) == 1
+
+    def add_many(self, records: Dict[str, Dict[str, Any]]) -> int:
+        """Create accounts with one write and one fsync, skipping taken usernames; returns how many were added."""
+        return self._write([(username, dict(record)) for username, record in records.items()], replace=False)
+
+    def update(self, username: str, record: Dict[str, Any]):
+        self._write([(username, dict(record))], replace=True)
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+    @contextmanager
+    def rewrite(self) -> Iterator[None]:
+        """Keep every writer, in this process or another, out while the log is replaced.
+
+        Takes the thread lock and then the file lock, the order _write uses,
+        and closes the open files so later calls open the new log.
+        """
+        with self._lock, file_lock(self.path):
+            self._close_locked()
+            yield
+
+    def _close_locked(self):
+        # Caller holds self._lock
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+def migrate_legacy_users(directory: UserDirectory) -> int:
+    """Fold users.json into the log; returns the number of accounts moved.
+
+    The rewritten log starts with a marker line, so the legacy file is
+    ignored from then on and re-running is a no-op.
+    """
+    legacy_path = directory.legacy_path
+    if not legacy_path or not os.path.exists(legacy_path) or directory.legacy_migrated():
+        return 0
+    with directory.rewrite():
+        tmp_path = directory.path + ".tmp"
+        count = 0
+        with open(tmp_path, "w") as out:
+            out.write(json.dumps({META_KEY: "migrated", "source": legacy_path}) + "\n")
+            for username, record in directory._iter_legacy():
+                out.write(json.dumps({"user": username, "record": record}, separators=(",", ":")) + "\n")
+                count += 1
+            # Accounts already in the log come after, so their latest lines still win
+            if os.path.exists(directory.path):
+                with open(directory.path, "rb") as log:
+                    for line in log:
+                        if line.endswith(b"\n") and META_KEY not in json.loads(line):
+                            out.write(line.decode("utf-8"))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, directory.path)
+        os.replace(legacy_path, legacy_path + ".migrated")
+    return count
+
+
+_directory: Optional[UserDirectory] = None
+_directory_lock = threading.Lock()
+
+
+def get_user_directory() -> UserDirectory:
+    """Process-wide directory shared by every session."""
+    global _directory
+    with _directory_lock:
+        if _directory is None:
+            _directory = UserDirectory()
+        return _directory
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ["migrate"]:
+        print("usage: python user_directory.py migrate")
+        return 2
+    moved = migrate_legacy_users(get_user_directory())
+    print(f"Moved {moved} account(s) into {USERS_LOG_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Bulk-create patient accounts from a CSV or JSON-lines file.
+
+    python user_import.py partner_patients.csv --errors partner_errors.jsonl
+
+Each row needs username, email and password (a CSV header row names the
+columns). Rows are streamed and validated in batches with the same rules as
+the signup form, deduplicated against existing accounts and earlier rows,
+and the passwords hashed on the credential pool. Every accepted account is
+then written in one transaction, so a failed import leaves nothing behind.
+Rejected rows go to the error file with their row number and reasons (never
+the password).
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from credentials import CredentialPool, hash_fields
+from storage import Storage, get_storage
+from utils import is_valid_email, is_valid_password
+
+BATCH_SIZE = 1000
+MAX_USERNAME_LENGTH = 20  # the signup form's max_chars
+
+# ASCII input is checked with these; anything else falls back to the utils
+# functions, whose str.isalpha/isupper checks also accept non-ASCII letters
+_EMAIL = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z]{2,})+")
+_PASSWORD_RULES = (
+    (re.compile(r"[A-Z]"), "Password must have at least one uppercase letter."),
+    (re.compile(r"[a-z]"), "Password must have at least one lowercase letter."),
+    (re.compile(r"[0-9]"), "Password must have at least one digit."),
+    (re.compile(r"[!@#$%^&*()\-_+=]"),
+     "Password must have at least one special character: !@#$%^&*()-_+="),
+)
+
+
+def email_ok(email: str) -> bool:
+    """Same result as utils.is_valid_email."""
+    if email.isascii():
+        return _EMAIL.fullmatch(email) is not None
+    return is_valid_email(email)
+
+
+def password_problem(password: str) -> Optional[str]:
+    """The message utils.is_valid_password would give, or None if the password is acceptable."""
+    if not password.isascii():
+        valid, message = is_valid_password(password)
+        return None if valid else message
+    if len(password) < 6:
+        return "Password must be at least 6 characters."
+    for pattern, message in _PASSWORD_RULES:
+        if pattern.search(password) is None:
+            return message
+    return None
+
+
+def read_rows(path: str, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """(row number, row) pairs; CSV rows are numbered from the first data line."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for number, row in enumerate(csv.DictReader(f), 1):
+                yield number, row
+        else:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    yield number, None
+
+
+def validate_batch(batch: List[Tuple[int, Any]], taken_user: Callable[[str], bool],
+                   taken_email: Callable[[str], bool], seen_users: set,
+                   seen_emails: set) -> Tuple[List[Tuple[str, str, str]], List[Dict[str, Any]]]:
+    """Split a batch into (username, email, password) rows to create and error entries."""
+    accepted, errors = [], []
+    for number, row in batch:
+        if not isinstance(row, dict):
+            errors.append({"row": number, "errors": ["Not a JSON object."]})
+            continue
+        username = str(row.get("username") or "")
+        email = str(row.get("email") or "")
+        password = str(row.get("password") or "")
+        problems = []
+        if not username or not email or not password:
+            problems.append("username, email and password are required.")
+        if len(username) > MAX_USERNAME_LENGTH:
+            problems.append(f"Username is longer than {MAX_USERNAME_LENGTH} characters.")
+        elif username and (username in seen_users or taken_user(username)):
+            problems.append("Username already exists.")
+        email_key = email.strip().lower()
+        if email and not email_ok(email):
+            problems.append("Invalid email format.")
+        elif email and (email_key in seen_emails or taken_email(email)):
+            problems.append("An account with this email already exists.")
+        message = password_problem(password) if password else None
+        if message:
+            problems.append(message)
+        if problems:
+            errors.append({"row": number, "username": username, "email": email, "errors": problems})
+            continue
+        seen_users.add(username)
+        seen_emails.add(email_key)
+        accepted.append((username, email, password))
+    return accepted, errors
+
+
+def import_users(path: str, storage: Optional[Storage] = None, errors_path: Optional[str] = None,
+                 fmt: Optional[str] = None, batch_size: int = BATCH_SIZE,
+                 pool: Optional[CredentialPool] = None,
+                 report: Callable[[str], None] = print) -> Dict[str, Any]:
+    """Validate and create every account in `path`; returns counts and phase timings."""
+    storage = storage or get_storage()
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    errors_path = errors_path or os.path.splitext(path)[0] + ".errors.jsonl"
+    own_pool = pool is None
+    pool = CredentialPool(queue_limit=batch_size) if own_pool else pool
+    records: Dict[str, Dict[str, Any]] = {}
+    seen_users: set = set()
+    seen_emails: set = set()
+    rows = rejected = 0
+    timings = {"validate": 0.0, "hash": 0.0, "write": 0.0}
+    started = time.perf_counter()
+
+    def flush(batch):
+        nonlocal rejected
+        phase = time.perf_counter()
+        accepted, errors = validate_batch(
+            batch, lambda u: storage.get_user(u) is not None,
+            lambda e: storage.get_username_by_email(e) is not None, seen_users, seen_emails)
+        for entry in errors:
+            out.write(json.dumps(entry) + "\n")
+        rejected += len(errors)
+        timings["validate"] += time.perf_counter() - phase
+        phase = time.perf_counter()
+        hashes = [pool.submit(hash_fields, password) for _, _, password in accepted]
+        for (username, email, _), future in zip(accepted, hashes):
+            records[username] = {"email": email, **future.result(), "role": "user"}
+        timings["hash"] += time.perf_counter() - phase
+        report(f"{rows} rows read, {len(records)} accepted, {rejected} rejected "
+               f"({rows / max(time.perf_counter() - started, 1e-9):,.0f} rows/s)")
+
+    try:
+        with open(errors_path, "w") as out:
+            batch = []
+            for number, row in read_rows(path, fmt):
+                rows += 1
+                batch.append((number, row))
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+    finally:
+        if own_pool:
+            pool.shutdown()
+
+    phase = time.perf_counter()
+    created = storage.add_users(records) if records else 0
+    timings["write"] = time.perf_counter() - phase
+    elapsed = time.perf_counter() - started
+    return {"rows": rows, "created": created, "rejected": rejected,
+            "skipped": len(records) - created, "seconds": elapsed,
+            "timings": timings, "errors_path": errors_path}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Bulk-create accounts from a CSV or JSON-lines file")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    parser.add_argument("--errors", help="per-row error file (default: <path>.errors.jsonl)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    result = import_users(args.path, errors_path=args.errors, fmt=args.format, batch_size=args.batch_size)
+    timings = result["timings"]
+    print(f"Done: {result['created']} account(s) created from {result['rows']} row(s) in "
+          f"{result['seconds']:.1f}s ({result['rows'] / max(result['seconds'], 1e-9):,.0f} rows/s); "
+          f"validate {timings['validate']:.2f}s, hash {timings['hash']:.2f}s, write {timings['write']:.2f}s")
+    if result["skipped"]:
+        print(f"{result['skipped']} username(s) were taken by signups during the import")
+    print(f"{result['rejected']} row(s) rejected (see {result['errors_path']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
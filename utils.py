@@ -1,12 +1,69 @@
 import json
 import os
+import re
 import base64
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # not on Windows; locks then only cover threads of this process
+    fcntl = None
+
 USERS_FILE = "users.json"
 MEDICINES_FILE = "medicines.json"
 ORDERS_FILE = "orders.json"
 CONSULTS_FILE = "consultations.json"
+ORDERS_JOURNAL_FILE = "orders.jsonl"
+USERS_LOG_FILE = "users.jsonl"  # append-only user registry over USERS_FILE
+
+# fsync policy for the order journal: "always", "interval" or "never"
+ORDER_JOURNAL_FSYNC = os.environ.get("MEDICARE_ORDER_FSYNC", "always")
+ORDER_JOURNAL_FSYNC_INTERVAL = 1.0  # seconds, used by the "interval" policy
+
+# Order compaction: orders older than ORDER_ARCHIVE_MAX_AGE_DAYS move from the
+# journal into monthly "gzip" or "lzma" segments under ORDER_ARCHIVE_DIR
+ORDER_ARCHIVE_DIR = os.environ.get("MEDICARE_ORDER_ARCHIVE_DIR", "order_archive")
+ORDER_ARCHIVE_MAX_AGE_DAYS = int(os.environ.get("MEDICARE_ORDER_ARCHIVE_DAYS", "365"))
+ORDER_ARCHIVE_CODEC = os.environ.get("MEDICARE_ORDER_ARCHIVE_CODEC", "gzip")
+
+# Write-behind queue: most records per group commit, and how long the writer
+# lingers for more writes before committing (seconds). With 0 a batch is
+# whatever queued up while the previous commit was running.
+WRITE_QUEUE_MAX_BATCH = 256
+WRITE_QUEUE_MAX_DELAY = float(os.environ.get("MEDICARE_WRITE_DELAY", "0"))
+# How long a page waits for its write before telling the user (seconds)
+WRITE_QUEUE_RESULT_TIMEOUT = float(os.environ.get("MEDICARE_WRITE_TIMEOUT", "10"))
+
+# Sharded order layout (the "sharded" backend): one journal per user under
+# ORDER_SHARD_DIR, or ORDER_SHARD_BUCKETS hash buckets of users when non-zero
+ORDER_SHARD_DIR = os.environ.get("MEDICARE_ORDER_SHARD_DIR", "orders")
+ORDER_SHARD_BUCKETS = int(os.environ.get("MEDICARE_ORDER_SHARD_BUCKETS", "0"))
+
+# Password hashing: "scrypt" or "pbkdf2_sha256", its cost, and the worker pool
+# that runs it (threads; hashlib releases the GIL while hashing). Logins beyond
+# PASSWORD_QUEUE_LIMIT waiting or running hashes are turned away.
+PASSWORD_HASH_SCHEME = os.environ.get("MEDICARE_PASSWORD_HASH", "scrypt")
+SCRYPT_COST = int(os.environ.get("MEDICARE_SCRYPT_N", str(2 ** 14)))  # r=8, p=1
+PBKDF2_ITERATIONS = int(os.environ.get("MEDICARE_PBKDF2_ITERATIONS", "600000"))
+PASSWORD_WORKERS = int(os.environ.get("MEDICARE_PASSWORD_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_QUEUE_LIMIT = int(os.environ.get("MEDICARE_PASSWORD_QUEUE", "64"))
+
+# Login throttling: token buckets per username and per browser session.
+# Each allows a burst, then refills at the given rate per minute.
+LOGIN_USER_BURST = int(os.environ.get("MEDICARE_LOGIN_USER_BURST", "5"))
+LOGIN_USER_PER_MINUTE = float(os.environ.get("MEDICARE_LOGIN_USER_PER_MINUTE", "5"))
+LOGIN_SESSION_BURST = int(os.environ.get("MEDICARE_LOGIN_SESSION_BURST", "10"))
+LOGIN_SESSION_PER_MINUTE = float(os.environ.get("MEDICARE_LOGIN_SESSION_PER_MINUTE", "10"))
+LOGIN_THROTTLE_MAX_KEYS = int(os.environ.get("MEDICARE_LOGIN_THROTTLE_KEYS", "100000"))
+
+# Storage backend: "json" (flat files above), "sharded" (json with per-user
+# order shards) or "sqlite"
+STORAGE_BACKEND = os.environ.get("MEDICARE_STORAGE", "json")
+SQLITE_DB_FILE = os.environ.get("MEDICARE_DB", "medicare.db")
 
 def load_json(filename):
     if not os.path.exists(filename):
@@ -14,22 +71,182 @@ def load_json(filename):
     with open(filename, "r") as f:
         return json.load(f)
 
-def save_json(filename, data):
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=2)
+_JSON_WS = re.compile(r"[ \t\n\r]*")
+_json_decoder = json.JSONDecoder()
+
+def _iter_json_members(filename, chunk_size, is_object):
+    open_char, close_char = ("{", "}") if is_object else ("[", "]")
+    kind = "object" if is_object else "array"
+    if not os.path.exists(filename):
+        return
+    with open(filename, "r") as f:
+        buf, pos, eof = "", 0, False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                pos = _JSON_WS.match(buf, pos).end()
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        def read_value(terminators):
+            nonlocal pos
+            while True:
+                try:
+                    value, end = _json_decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    end = None
+                if end is not None:
+                    after = _JSON_WS.match(buf, end).end()
+                # Until a terminator follows it, the value (a number, say) may
+                # continue in the next chunk
+                if end is None or (not eof and (after == len(buf) or buf[after] not in terminators)):
+                    if eof:
+                        raise ValueError(f"{filename} is not a valid JSON {kind}")
+                    fill()
+                    continue
+                pos = after
+                return value
+
+        fill()
+        skip_ws()
+        if buf[pos:pos + 1] != open_char:
+            raise ValueError(f"{filename} is not a JSON {kind}")
+        pos += 1
+        skip_ws()
+        if buf[pos:pos + 1] == close_char:
+            return
+        while True:
+            if is_object:
+                key = read_value(":")
+                if not isinstance(key, str) or buf[pos:pos + 1] != ":":
+                    raise ValueError(f"{filename} is not a valid JSON {kind}")
+                pos += 1
+                skip_ws()
+                yield key, read_value("," + close_char)
+            else:
+                yield read_value("," + close_char)
+            sep = buf[pos:pos + 1]
+            if sep == close_char:
+                return
+            if sep != ",":
+                raise ValueError(f"{filename} is not a valid JSON {kind}")
+            pos += 1
+            skip_ws()
+
+def iter_json(filename, chunk_size=1 << 16):
+    """Yield the records of a top-level JSON array file one at a time.
 
-def load_user_data():
-    if not os.path.exists(USERS_FILE):
-        return {}
+    Reads fixed-size chunks, so memory stays at one chunk plus the record
+    being decoded however large the file is. A missing file yields nothing,
+    like load_json returning [].
+    """
+    return _iter_json_members(filename, chunk_size, is_object=False)
+
+def iter_json_items(filename, chunk_size=1 << 16):
+    """Yield (key, value) pairs of a top-level JSON object file, like users.json, one at a time."""
+    return _iter_json_members(filename, chunk_size, is_object=True)
+
+_lock_stats = {}  # filename -> [acquisitions, total wait, longest wait] in seconds
+_lock_stats_guard = threading.Lock()
+_thread_locks = {}
+
+@contextmanager
+def file_lock(filename):
+    """Exclusive advisory lock on `filename` shared by every process on the host.
+
+    The lock lives on a separate "<filename>.lock" file, because atomic
+    writes replace the data file itself. Time spent waiting is recorded in
+    lock_stats().
+    """
+    with _lock_stats_guard:
+        thread_lock = _thread_locks.setdefault(filename, threading.Lock())
+    start = time.perf_counter()
+    with thread_lock:
+        fd = os.open(filename + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            waited = time.perf_counter() - start
+            with _lock_stats_guard:
+                stats = _lock_stats.setdefault(filename, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += waited
+                stats[2] = max(stats[2], waited)
+            yield
+        finally:
+            os.close(fd)  # closing the descriptor releases the flock
+
+def lock_stats():
+    """Lock acquisitions and wait times (ms) per file, for this process."""
+    with _lock_stats_guard:
+        return {
+            filename: {
+                "acquired": count,
+                "wait_ms_total": round(total * 1000, 3),
+                "wait_ms_avg": round(total * 1000 / count, 3),
+                "wait_ms_max": round(longest * 1000, 3),
+            }
+            for filename, (count, total, longest) in _lock_stats.items()
+        }
+
+def _fsync_dir(path):
     try:
-        with open(USERS_FILE, "r") as file:
-            return json.load(file)
-    except Exception:
-        return {}
-
-def save_user_data(user_data):
-    with open(USERS_FILE, "w") as file:
-        json.dump(user_data, file, indent=2)
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+# Read once at import: os.umask can only be queried by setting it, which is not thread-safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _replacement_mode(filename):
+    """Permissions for a file replacing `filename`: its current mode, or 0644 less the umask."""
+    try:
+        return os.stat(filename).st_mode & 0o7777
+    except FileNotFoundError:
+        return 0o644 & ~_UMASK
+
+def save_json(filename, data):
+    """Write via a temp file, fsync and rename, so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(filename) + ".", suffix=".tmp")
+    try:
+        # mkstemp creates the file 0600; keep the mode readers of the real file rely on
+        if hasattr(os, "fchmod"):  # not on Windows before 3.13
+            os.fchmod(fd, _replacement_mode(filename))
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_dir(directory)
+
+def update_json(filename, modify, default=list):
+    """Locked read-modify-write: modify(data) changes data in place and its return value is passed back."""
+    with file_lock(filename):
+        data = load_json(filename) if os.path.exists(filename) else default()
+        result = modify(data)
+        save_json(filename, data)
+    return result
 
 def is_valid_email(email):
     if "@" not in email or email.count("@") != 1:
@@ -0,0 +1,173 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from storage import Storage, get_storage
+from utils import WRITE_QUEUE_MAX_BATCH, WRITE_QUEUE_MAX_DELAY
+
+ORDER = "order"
+CONSULTATION = "consultation"
+_FLUSH = "flush"
+_STOP = "stop"
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve(future: Future, result: Any = None, error: Optional[BaseException] = None):
+    """Settle a future unless it is already settled or the caller cancelled it."""
+    if future.done() or not (future.running() or future.set_running_or_notify_cancel()):
+        return
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
+
+
+class WriteBehindQueue:
+    """Orders and consultations committed by one writer thread in batches.
+
+    Callers get a Future that resolves once their record is in the store (or
+    fails with the store's exception). The writer takes everything queued up
+    to max_batch records, lingering at most max_delay for stragglers, and
+    hands each kind to the store in one call, so checkouts that arrive while
+    a commit is running share the next journal write and fsync.
+    """
+
+    def __init__(self, storage: Optional[Storage] = None,
+                 max_batch: int = WRITE_QUEUE_MAX_BATCH,
+                 max_delay: float = WRITE_QUEUE_MAX_DELAY):
+        self._storage = storage
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Tuple[str, Any, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._batches = 0
+        self._records = 0
+
+    @property
+    def storage(self) -> Storage:
+        return self._storage or get_storage()
+
+    def _put(self, kind: str, record: Any) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("write queue is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+            self._queue.put((kind, record, future))
+        return future
+
+    def submit_order(self, order: Dict[str, Any]) -> Future:
+        return self._put(ORDER, order)
+
+    def submit_consultation(self, consultation: Dict[str, Any]) -> Future:
+        return self._put(CONSULTATION, consultation)
+
+    def depth(self) -> int:
+        """Records and markers waiting for the writer."""
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth(),
+            "batches": self._batches,
+            "records": self._records,
+            "avg_batch": round(self._records / self._batches, 2) if self._batches else 0.0,
+        }
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until everything submitted before this call is committed."""
+        with self._lock:
+            if self._thread is None:
+                return
+        self._put(_FLUSH, None).result(timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Commit what is queued, then stop the writer. Later submits raise."""
+        with self._lock:
+            if self._closed:
+                return
+            if self._thread is None:
+                self._closed = True
+                return
+            future: Future = Future()
+            self._queue.put((_STOP, None, future))
+            self._closed = True
+        future.result(timeout)
+        self._thread.join(timeout)
+
+    def _take_batch(self) -> List[Tuple[str, Any, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch and batch[-1][0] not in (_FLUSH, _STOP):
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, batch: List[Tuple[str, Any, Future]]):
+        if all(kind in (_FLUSH, _STOP) for kind, _, _ in batch):
+            return
+        storage = self.storage
+        for kind, append in ((ORDER, storage.append_orders), (CONSULTATION, storage.append_consultations)):
+            entries = [(record, future) for k, record, future in batch if k == kind]
+            if not entries:
+                continue
+            try:
+                append([record for record, _ in entries])
+            except Exception as e:
+                for _, future in entries:
+                    _resolve(future, error=e)
+                continue
+            self._records += len(entries)
+            for record, future in entries:
+                _resolve(future, record)
+        self._batches += 1
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            stop = any(kind == _STOP for kind, _, _ in batch)
+            try:
+                self._commit(batch)
+                for kind, _, future in batch:
+                    if kind in (_FLUSH, _STOP):
+                        _resolve(future)
+            except BaseException as e:
+                # Fail this batch but keep the writer alive, or every later caller would hang
+                logger.exception("Write-behind batch failed")
+                for _, _, future in batch:
+                    _resolve(future, error=e)
+            if stop:
+                return
+
+
+_write_queue: Optional[WriteBehindQueue] = None
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue() -> WriteBehindQueue:
+    """Process-wide write queue, flushed when the interpreter exits."""
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None:
+            _write_queue = WriteBehindQueue()
+            atexit.register(_write_queue.close)
+        return _write_queue